@@ -0,0 +1,169 @@
+"""
+Random playouts of many SuperTicTacToe games at once, with NumPy.
+
+BatchSimulation holds K games as NumPy arrays and advances all of them one
+move per step: a uniformly random legal move is chosen for every game still
+in progress, the sub board it was played in is checked for a win with a
+table of line masks, and finished games are retired. The rules are those of
+game_state.SuperTicTacToe (the first move may be anywhere, a player is sent
+to the sub board matching the last square played if it is still open and may
+play in any open sub board otherwise, and winning 3 sub boards wins), so
+the moves of any game can be replayed with SuperTicTacToe to cross-check
+the result.
+
+Typical use, K rollouts from a position:
+
+    results = BatchSimulation.from_state(state, 1024, seed=1).run()
+"""
+import numpy as np
+
+from game_state import (GameState, SuperTicTacToe, BitboardSuperTicTacToe,
+                        WINS)
+
+# _WIN_TABLE[mask] is True if the 9 bit mask of a player's squares in a sub
+# board contains a line.
+_WIN_TABLE = np.array(WINS, dtype=bool)
+
+_POWERS = (1 << np.arange(9)).astype(np.int32)
+
+
+class BatchSimulation:
+    """ K SuperTicTacToe games played in lockstep.
+
+    Attributes:
+        board (np.ndarray): (K, 9, 9) int8, the owner of each square
+            (0 empty, 1 or 2), indexed by [game, sub_board, square].
+        closed (np.ndarray): (K, 9) bool, sub boards won or full.
+        sub_boards_won (np.ndarray): (K, 3) int, as in SuperTicTacToe.
+        last_square_played (np.ndarray): (K,) int.
+        first_move (np.ndarray): (K,) bool, True until the first move.
+        player_to_move (np.ndarray): (K,) int8, 1 or 2.
+        active (np.ndarray): (K,) bool, games not over yet.
+        moves (List[np.ndarray]): If recording, for each step the move
+            played in each game as 9 * sub_board + square, or -1.
+    """
+
+    def __init__(self, k: int, seed=None, record=False):
+        """Start K new games.
+
+        Args:
+            k: Number of games.
+            seed: Seed for the NumPy random generator.
+            record: True => keep the moves played in self.moves.
+        """
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.board = np.zeros((k, 9, 9), dtype=np.int8)
+        self.closed = np.zeros((k, 9), dtype=bool)
+        self.sub_boards_won = np.zeros((k, 3), dtype=np.int32)
+        self.last_square_played = np.zeros(k, dtype=np.int64)
+        self.first_move = np.ones(k, dtype=bool)
+        self.player_to_move = np.ones(k, dtype=np.int8)
+        self.active = np.ones(k, dtype=bool)
+        self.record = record
+        self.moves = []
+
+    @classmethod
+    def from_state(cls, state: GameState, k: int, seed=None,
+                   record=False) -> 'BatchSimulation':
+        """ Start K copies of a SuperTicTacToe or BitboardSuperTicTacToe
+        position.
+        """
+        sim = cls(k, seed=seed, record=record)
+        if isinstance(state, SuperTicTacToe):
+            board = np.array(state.board, dtype=np.int8)
+        elif isinstance(state, BitboardSuperTicTacToe):
+            bits = np.arange(81)
+            x = np.array([state.marks[1] >> int(i) & 1 for i in bits])
+            o = np.array([state.marks[2] >> int(i) & 1 for i in bits])
+            board = (x + 2 * o).astype(np.int8).reshape(9, 9)
+        else:
+            raise TypeError('Cannot simulate ' + type(state).__name__)
+        sim.board[:] = board
+        for sub_board in range(9):
+            sub = board[sub_board]
+            won = any(_WIN_TABLE[int(np.dot(sub == p, _POWERS))]
+                      for p in (1, 2))
+            sim.closed[:, sub_board] = won or not (sub == 0).any()
+        sim.sub_boards_won[:] = state.sub_boards_won
+        sim.last_square_played[:] = state.last_square_played
+        sim.first_move[:] = state.squares_played == 0
+        sim.player_to_move[:] = 3 - state.player_just_moved
+        sim.active[:] = state.has_moves()
+        return sim
+
+    def legal_moves(self) -> np.ndarray:
+        """ Return a (K, 9, 9) bool mask of the legal moves of each game. """
+        games = np.arange(self.k)
+        open_sub_boards = ~self.closed
+        # Sent to the sub board of the last square, if it is open.
+        sent = ~self.first_move & open_sub_boards[games,
+                                                  self.last_square_played]
+        allowed = open_sub_boards.copy()
+        allowed[sent] = False
+        allowed[sent, self.last_square_played[sent]] = True
+        legal = (self.board == 0) & allowed[:, :, None]
+        legal &= self.active[:, None, None]
+        return legal
+
+    def step(self) -> bool:
+        """ Play one random legal move in every active game.
+
+        Returns:
+            True if any game is still active afterwards.
+        """
+        legal = self.legal_moves().reshape(self.k, 81)
+        has_move = legal.any(axis=1)
+        self.active &= has_move
+        if not self.active.any():
+            return False
+
+        # A uniformly random legal move: the legal square with the largest
+        # random key.
+        keys = self.rng.random((self.k, 81))
+        keys[~legal] = -1.0
+        choice = keys.argmax(axis=1)
+        games = np.nonzero(self.active)[0]
+        choice = choice[games]
+        sub_boards = choice // 9
+        squares = choice % 9
+        players = self.player_to_move[games]
+
+        self.board[games, sub_boards, squares] = players
+        if self.record:
+            played = np.full(self.k, -1, dtype=np.int64)
+            played[games] = choice
+            self.moves.append(played)
+
+        # Check the sub boards played in for a win or for being full.
+        subs = self.board[games, sub_boards]
+        masks = ((subs == players[:, None]) * _POWERS).sum(axis=1)
+        won = _WIN_TABLE[masks]
+        full = (subs != 0).all(axis=1)
+        self.sub_boards_won[games[won], players[won]] += 1
+        self.closed[games, sub_boards] |= won | full
+
+        self.last_square_played[games] = squares
+        self.first_move[games] = False
+        self.player_to_move[games] = 3 - players
+        self.active[games] &= self.sub_boards_won[games, players] < 3
+        return bool(self.active.any())
+
+    def run(self, player: int = 1) -> np.ndarray:
+        """ Play all the games to the end.
+
+        Returns:
+            (K,) float, get_result(player) of each game.
+        """
+        while self.step():
+            pass
+        return self.get_results(player)
+
+    def get_results(self, player: int = 1) -> np.ndarray:
+        """ Return get_result(player) of each game: 1.0 if player wins,
+        0.0 if player loses, 0.5 for a draw (or if not over).
+        """
+        results = np.full(self.k, 0.5)
+        results[self.sub_boards_won[:, player] == 3] = 1.0
+        results[self.sub_boards_won[:, 3 - player] == 3] = 0.0
+        return results
@@ -0,0 +1,397 @@
+"""
+Benchmarks for the game engines and the search.
+
+Measures, with fixed seeds:
+
+    - do_move, clone and get_moves operations per second for each game
+    - random rollouts per second for each game
+    - search iterations per second at several tree sizes
+    - peak memory per 100k tree nodes (play.Node and compact_tree)
+    - tree nodes and iterations per second with symmetry-merged expansion
+
+and prints the results as JSON. Each rate is given as measured (NAME_per_sec,
+in operations per second) and normalized by the speed of a reference loop
+timed next to it (NAME_per_sec_normalized), which can be compared between
+runs on a machine whose speed varies. With --baseline, the results are
+compared with a file saved earlier with --save, and the exit status is 1 if
+any normalized throughput dropped (or memory grew) by more than --tolerance,
+or the geometric mean of the normalized throughputs dropped by more than
+--mean-tolerance.
+
+Usage:
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json
+"""
+import argparse
+import gc
+import json
+import math
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import compact_tree
+import play
+import rave
+import symmetry
+from game_state import (GameState, TicTacToe, SuperTicTacToe,
+                        BitboardSuperTicTacToe)
+
+GAMES = [TicTacToe, SuperTicTacToe, BitboardSuperTicTacToe]
+
+SEED = 12345
+
+# A benchmark to time: a function that does some operations and returns their
+# number, and a function to call, untimed, before each call of it (or None).
+Timing = Tuple[Callable[[], int], Callable[[], None]]
+
+# The benchmarks are timed together in ROUNDS rounds, each calling every
+# benchmark until it has taken at least SLICE seconds (as
+# timeit.Timer.autorange does), so that a change in the speed of the machine
+# during a run affects them all alike. The median rate of the calls of each
+# benchmark is reported.
+ROUNDS = 10
+SLICE = 0.1
+
+# The speed of a shared or throttled machine can change by tens of percent
+# from one second to the next. So each call is also normalized by the speed of
+# a reference loop of REFERENCE_LOOPS iterations, timed just before and just
+# after it: normalized rates are given as if the loop ran at REFERENCE_SPEED
+# iterations per second. The loop allocates small objects holding a list and
+# a dict, like the game states and tree nodes, as their speed follows that of
+# the machine more closely than plain arithmetic does.
+REFERENCE_LOOPS = 2000
+REFERENCE_SPEED = 1e6
+
+
+def sample_states(game: type, count: int) -> List[GameState]:
+    """ Return count non-terminal states from seeded random games. """
+    rng = random.Random(SEED)
+    states = []
+    while len(states) < count:
+        state = game()
+        while state.has_moves() and len(states) < count:
+            states.append(state.clone())
+            state.do_move(rng.choice(state.get_moves()))
+    return states
+
+
+def rate(count: int, seconds: float) -> float:
+    """ Operations per second. """
+    return count / seconds if seconds > 0 else float('inf')
+
+
+class _Reference:
+    """ An object of the reference loop. """
+
+    def __init__(self, squares: List[int], owners: Dict[int, int]):
+        self.squares = squares
+        self.owners = owners
+
+
+def reference_speed() -> float:
+    """ Iterations per second of the reference loop, right now. """
+    objects = []
+    start = time.perf_counter()
+    for i in range(REFERENCE_LOOPS):
+        objects.append(_Reference([i] * 9, {i: i}))
+    return rate(REFERENCE_LOOPS, time.perf_counter() - start)
+
+
+def timed_call(run: Callable[[], int], setup: Callable[[], None] = None
+               ) -> Tuple[float, float, float]:
+    """ Time one call of run, with the garbage collector off as timeit does.
+
+    Returns:
+        The seconds it took, its operations per second, and its operations
+        per second at REFERENCE_SPEED.
+    """
+    if setup is not None:
+        setup()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        before = reference_speed()
+        start = time.perf_counter()
+        count = run()
+        seconds = time.perf_counter() - start
+        speed = (before + reference_speed()) / 2
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    raw = rate(count, seconds)
+    return seconds, raw, raw * REFERENCE_SPEED / speed
+
+
+def timed_rates(timings: Dict[str, Timing]
+                ) -> Dict[str, Tuple[float, float]]:
+    """ Time the benchmarks together, in ROUNDS rounds.
+
+    Returns:
+        For each benchmark, the median operations per second of its calls,
+        and the median operations per second at REFERENCE_SPEED.
+    """
+    raw = {name: [] for name in timings}
+    normalized = {name: [] for name in timings}
+    for r in range(ROUNDS):
+        for name, (run, setup) in timings.items():
+            total = 0.0
+            while total < SLICE:
+                seconds, raw_rate, normalized_rate = timed_call(run, setup)
+                total += seconds
+                raw[name].append(raw_rate)
+                normalized[name].append(normalized_rate)
+    return {name: (statistics.median(raw[name]),
+                   statistics.median(normalized[name]))
+            for name in timings}
+
+
+def bench_operations(game: type, count: int) -> Dict[str, Timing]:
+    """ do_move, clone and get_moves on count sample states. """
+    states = sample_states(game, count)
+    rng = random.Random(SEED)
+    moves = [rng.choice(state.get_moves()) for state in states]
+    fresh = []
+
+    def clone() -> int:
+        for state in states:
+            state.clone()
+        return count
+
+    def get_moves() -> int:
+        for state in states:
+            state.get_moves()
+        return count
+
+    def new_states():
+        # do_move changes the states, so it is timed on fresh copies.
+        fresh[:] = [state.clone() for state in states]
+
+    def do_move() -> int:
+        for state, move in zip(fresh, moves):
+            state.do_move(move)
+        return count
+
+    return {'clone': (clone, None),
+            'get_moves': (get_moves, None),
+            'do_move': (do_move, new_states)}
+
+
+def bench_rollouts(game: type, count: int) -> Timing:
+    """ Random rollouts from the start of the game. """
+    def rollouts() -> int:
+        rng = random.Random(SEED)
+        for i in range(count):
+            game().do_random_rollout(rng)
+        return count
+
+    return rollouts, None
+
+
+def bench_search(game: type, itermax: int, in_place=False) -> Timing:
+    """ play.search iterations for a tree of itermax iterations. """
+    def search() -> int:
+        random.seed(SEED)
+        play.search(game(), itermax, in_place=in_place)
+        return itermax
+
+    return search, None
+
+
+def count_tree(state: GameState, depth: int, moves) -> int:
+    """ Nodes in the tree of state to depth, expanding moves(state). """
+    if depth == 0:
+        return 1
+    count = 1
+    for m in moves(state):
+        child = state.clone()
+        child.do_move(m)
+        count += count_tree(child, depth - 1, moves)
+    return count
+
+
+def bench_symmetry(game: type, itermax: int, depth: int
+                   ) -> Tuple[Dict[str, Timing], Dict[str, float]]:
+    """ Iterations of play.search and symmetry.search, and the size of the
+    full tree to depth that each would expand. Their strength is compared by
+    tournament.equal_strength(), which plays matches and is too slow for a
+    benchmark.
+    """
+    def iterations(node_class: type) -> Timing:
+        rootstate = game()
+
+        def search() -> int:
+            random.seed(SEED)
+            play.iterate(node_class(state=rootstate), rootstate, itermax)
+            return itermax
+
+        return search, None
+
+    timings = {}
+    nodes = {}
+    for name, node_class, moves in (
+            ('plain', play.Node, lambda s: s.get_moves()),
+            ('symmetric', symmetry.SymmetricNode, symmetry.unique_moves)):
+        timings[name + '_' + str(itermax) + '_iters_per_sec'] = iterations(
+            node_class)
+        nodes[name + '_depth_' + str(depth) + '_nodes'] = count_tree(
+            game(), depth, moves)
+    return timings, nodes
+
+
+def count_nodes(node: play.Node) -> int:
+    """ Number of nodes in the tree under node. """
+    count = 0
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        count += 1
+        stack.extend(n.child_nodes)
+    return count
+
+
+def bench_memory(game: type, itermax: int) -> Dict[str, float]:
+    """ Peak bytes per 100k nodes of a tree grown for itermax iterations. """
+    random.seed(SEED)
+    rootstate = game()
+    tracemalloc.start()
+    rootnode = play.Node(state=rootstate)
+    play.iterate(rootnode, rootstate, itermax)
+    node_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    nodes = count_nodes(rootnode)
+    del rootnode
+
+    random.seed(SEED)
+    tracemalloc.start()
+    rootnode = rave.RaveNode(state=rootstate)
+    rave.iterate(rootnode, rootstate, itermax)
+    rave_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rave_nodes = count_nodes(rootnode)
+    del rootnode
+
+    random.seed(SEED)
+    tracemalloc.start()
+    tree = compact_tree.CompactTree(capacity=1024)
+    compact_tree.iterate(tree, rootstate, itermax)
+    compact_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'node': node_peak * 100000 / nodes,
+            'rave_node': rave_peak * 100000 / rave_nodes,
+            'compact_tree': compact_peak * 100000 / tree.size}
+
+
+def run(quick=False) -> Dict[str, float]:
+    """ Run all the benchmarks.
+
+    Returns:
+        A flat dict of result name to value. Names ending in '_per_sec' are
+        measured rates and names ending in '_per_sec_normalized' the same
+        rates normalized by the reference loop; both are better when higher.
+        Names ending in '_bytes' or '_nodes' are better when lower.
+    """
+    scale = 10 if quick else 1
+    results = {}
+    timings = {}
+    for game in GAMES:
+        name = game.__name__
+        ops = bench_operations(game, 20000 // scale)
+        for op, timing in ops.items():
+            timings[name + '.' + op + '_per_sec'] = timing
+        timings[name + '.rollouts_per_sec'] = bench_rollouts(
+            game, 2000 // scale)
+        for itermax in (100, 1000) if quick else (100, 1000, 10000):
+            timings[name + '.search_' + str(itermax) + '_iters_per_sec'] = (
+                bench_search(game, itermax))
+        timings[name + '.search_in_place_1000_iters_per_sec'] = (
+            bench_search(game, 1000, in_place=True))
+    for game in (TicTacToe, BitboardSuperTicTacToe):
+        depth = 4 if game is TicTacToe else 2
+        symmetric_timings, nodes = bench_symmetry(game, 1000, depth)
+        for key, timing in symmetric_timings.items():
+            timings[game.__name__ + '.' + key] = timing
+        for key, value in nodes.items():
+            results[game.__name__ + '.' + key] = value
+    for name, (raw, normalized) in timed_rates(timings).items():
+        results[name] = raw
+        results[name + '_normalized'] = normalized
+    for game in (TicTacToe, BitboardSuperTicTacToe):
+        memory = bench_memory(game, 20000 // scale)
+        for tree, value in memory.items():
+            name = game.__name__ + '.' + tree + '_peak_per_100k_nodes_bytes'
+            results[name] = value
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            tolerance: float, mean_tolerance: float) -> List[str]:
+    """ Return a description of each result worse than baseline by more than
+    tolerance (a fraction), and of the geometric mean of the normalized rates
+    if it is worse by more than mean_tolerance. The measured rates vary with
+    the speed of the machine, so only their normalized values are compared.
+    On a shared machine whose speed varies by half, a single normalized rate
+    still varied by up to 21% between runs, and their geometric mean by up
+    to 7%.
+    """
+    regressions = []
+    log_ratios = []
+    for name, old in sorted(baseline.items()):
+        if name not in results or old == 0 or name.endswith('_per_sec'):
+            continue
+        new = results[name]
+        change = (new - old) / old
+        if name.endswith('_bytes') or name.endswith('_nodes'):
+            change = -change
+        elif new > 0:
+            log_ratios.append(math.log(new / old))
+        if change < -tolerance:
+            regressions.append('%s: %.4g -> %.4g (%+.1f%%)' %
+                               (name, old, new, 100 * change))
+    if log_ratios:
+        change = math.exp(statistics.mean(log_ratios)) - 1
+        if change < -mean_tolerance:
+            regressions.append('geometric mean of %d normalized rates: '
+                               '%+.1f%%' % (len(log_ratios), 100 * change))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='run smaller benchmarks')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as a baseline')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown of each result '
+                        '(default 0.25)')
+    parser.add_argument('--mean-tolerance', type=float, default=0.1,
+                        help='allowed fractional slowdown of the geometric '
+                        'mean of the normalized rates (default 0.1)')
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance,
+                              args.mean_tolerance)
+        for r in regressions:
+            print('Regression:', r, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
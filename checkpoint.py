@@ -0,0 +1,225 @@
+"""
+Saving search trees to disk, and resuming searches from them.
+
+save() streams a play.Node tree to a file, optionally leaving out subtrees
+visited fewer than min_visits times. Checkpoint memory-maps the file and
+rebuilds the tree lazily: the children of a node are read only when the
+search first looks at them, so a large checkpoint can be opened at once and
+only the part the search uses is ever loaded. The pruned moves become
+untried moves again, and their visits stay counted in their parent.
+
+The file is:
+
+    header   magic b'MCTK', version (uint16), squares on the board (uint16),
+             key of the root state (uint64), little endian
+    nodes    for each node, in post-order (children before their parent, so
+             the root is last): move (uint8, 255 at the root), number of
+             children (uint8), visits (uint32), wins (float64), nodes in its
+             subtree (uint32)
+
+Post-order lets save() write each node as soon as its subtree is done,
+without seeking, and the subtree sizes let a reader step from the last child
+of a node back over the subtrees of its other children.
+
+search() resumes from a checkpoint and can write a new one, and
+parallel.ParallelSearch(checkpoint=...) starts every worker from the same
+checkpointed tree.
+"""
+import hashlib
+import mmap
+import os
+import struct
+from typing import List
+
+from game_state import (GameState, TicTacToe, move_to_index,
+                        index_to_move)
+from play import Node, iterate, best_move
+
+MAGIC = b'MCTK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+RECORD = struct.Struct('<BBIdI')
+ROOT_MOVE = 255
+
+
+def root_key(state: GameState) -> int:
+    """ A 64 bit key identifying the root state of a checkpoint. """
+    zobrist = getattr(state, 'zobrist', None)
+    if zobrist is not None:
+        return zobrist
+    text = repr(state) + str(state.player_just_moved)
+    return int.from_bytes(hashlib.blake2b(text.encode(),
+                                          digest_size=8).digest(), 'little')
+
+
+def save(rootnode: Node, rootstate: GameState, path: str,
+         min_visits: int = 0) -> int:
+    """ Write a search tree to a file.
+
+    Args:
+        rootnode: Root of the tree.
+        rootstate: The state at rootnode.
+        path: File to write.
+        min_visits: Children visited fewer times than this are left out,
+            with their subtrees.
+
+    Returns:
+        The number of nodes written.
+    """
+    squares = 9 if isinstance(rootstate, TicTacToe) else 81
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, squares, root_key(rootstate)))
+
+        def write(node: Node, move: int) -> int:
+            size = 1
+            children = 0
+            for c in node.child_nodes:
+                if c.visits >= min_visits:
+                    size += write(c, move_to_index(c.move))
+                    children += 1
+            f.write(RECORD.pack(move, children, node.visits, node.wins, size))
+            return size
+
+        return write(rootnode, ROOT_MOVE)
+
+
+class Checkpoint:
+    """ A memory-mapped checkpoint file.
+
+    Keep it open while a tree loaded from it is in use.
+
+    Attributes:
+        squares (int): Squares on the board, 9 or 81.
+        key (int): root_key() of the root state.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.squares, self.key = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a checkpoint')
+        self.path = path
+
+    def __len__(self) -> int:
+        """ The number of nodes. """
+        return (len(self.map) - HEADER.size) // RECORD.size
+
+    def record(self, index: int):
+        """ (move, children, visits, wins, size) of node index. """
+        return RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+
+    def children(self, index: int) -> List[int]:
+        """ The indices of the children of node index, in order. """
+        count = self.record(index)[1]
+        children = []
+        child = index - 1
+        for i in range(count):
+            children.append(child)
+            child -= self.record(child)[4]
+        children.reverse()
+        return children
+
+    def root(self, rootstate: GameState) -> 'CheckpointNode':
+        """ The root of the saved tree, for searching from rootstate.
+
+        Raises:
+            ValueError if the tree was not saved from rootstate.
+        """
+        if root_key(rootstate) != self.key:
+            raise ValueError(self.path + ' was saved from another position')
+        return CheckpointNode(state=rootstate, checkpoint=self,
+                              index=len(self) - 1)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self) -> 'Checkpoint':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CheckpointNode(Node):
+    """ A node of a tree loaded from a Checkpoint.
+
+    Its saved children are created the first time child_nodes is used, and
+    behave like any Node from then on.
+    """
+
+    _state = None
+
+    def __init__(self, move=None, parent: Node = None, state: GameState = None,
+                 checkpoint: Checkpoint = None, index: int = None):
+        super().__init__(move=move, parent=parent, state=state)
+        self._checkpoint = checkpoint
+        self._indices = checkpoint.children(index)
+        self.visits, self.wins = checkpoint.record(index)[2:4]
+        if self._indices:
+            self._moves = [index_to_move(checkpoint.record(i)[0],
+                                         checkpoint.squares)
+                           for i in self._indices]
+            for m in self._moves:
+                self.untried_moves.remove(m)
+            self._state = state.clone()
+
+    @property
+    def child_nodes(self) -> List[Node]:
+        if self._state is not None:
+            state = self._state
+            self._state = None
+            for m, i in zip(self._moves, self._indices):
+                s = state.clone()
+                s.do_move(m)
+                self._child_nodes.append(CheckpointNode(
+                    move=m, parent=self, state=s,
+                    checkpoint=self._checkpoint, index=i))
+        return self._child_nodes
+
+    @child_nodes.setter
+    def child_nodes(self, nodes: List[Node]):
+        self._child_nodes = nodes
+
+
+def search(rootstate: GameState, itermax: int, checkpoint: str = None,
+           save_to: str = None, min_visits: int = 0,
+           verbose=False) -> 'Move':
+    """ Do a UCT search, resuming from a checkpoint.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Iterations to add to the tree.
+        checkpoint: Checkpoint file saved from rootstate to start from, or
+            None to start from an empty tree.
+        save_to: File to save the tree to afterwards, or None. May be the
+            checkpoint file itself.
+        min_visits: Passed to save().
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    if checkpoint is None:
+        rootnode = Node(state=rootstate)
+        iterate(rootnode, rootstate, itermax)
+        if save_to is not None:
+            save(rootnode, rootstate, save_to, min_visits)
+        return _result(rootnode, verbose)
+    with Checkpoint(checkpoint) as saved:
+        rootnode = saved.root(rootstate)
+        iterate(rootnode, rootstate, itermax)
+        if save_to is not None:
+            # The unloaded part of the tree is still read from the old file
+            # while the new one is written.
+            save(rootnode, rootstate, save_to + '.tmp', min_visits)
+            os.replace(save_to + '.tmp', save_to)
+        # The root's children may not be loaded yet, so this needs the file.
+        return _result(rootnode, verbose)
+
+
+def _result(rootnode: Node, verbose: bool) -> 'Move':
+    """ Print the root's children if verbose, and return the best move. """
+    if verbose:
+        print(rootnode.children_to_string())
+    return best_move(rootnode)
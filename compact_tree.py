@@ -0,0 +1,274 @@
+"""
+Monte Carlo Tree Search with the tree kept in flat arrays.
+
+A play.Node is a full Python object with its own lists of children and
+untried moves. For searches of millions of iterations that costs gigabytes
+and a lot of garbage collector time. CompactTree instead keeps the nodes in
+parallel arrays (from the array module) indexed by node number, about 30
+bytes per node:
+
+    move           index of the move that led to the node, see CompactTree.moves
+    parent         parent node, -1 for the root
+    first_child    most recently added child, -1 if none
+    next_sibling   next older sibling, -1 if none
+    visits, wins   UCT statistics ('wins' is from the viewpoint of
+                   player_just_moved, as in play.Node)
+    player         player_just_moved at the node
+    status         whether the node's moves have been generated yet
+
+The untried moves of a node are only generated when the search first tries
+to expand it, and only kept while the node is partly expanded.
+
+The arrays are preallocated and grow by doubling up to max_nodes. Once the
+tree is full, the search carries on without adding nodes, so memory use is
+bounded. search() here plays the same moves as play.search for the same seed.
+"""
+import math
+import random
+from array import array
+from typing import List
+
+from game_state import GameState
+
+# Values of CompactTree.status.
+UNEXPANDED = 0  # Moves not generated yet.
+EXPANDING = 1  # Some untried moves left, see CompactTree.untried.
+EXPANDED = 2  # All moves have a child node.
+TERMINAL = 3  # No moves.
+
+
+class CompactTree:
+    """ A game tree kept in preallocated, growable parallel arrays.
+
+    Node 0 is the root. Moves are stored as indices into the moves list, so
+    any hashable move type can be used.
+
+    Attributes:
+        size (int): Number of nodes in use.
+        max_nodes (int): The tree never grows beyond this many nodes.
+        moves (List[Move]): Move for each move index.
+        untried (Dict[int, List[int]]): Untried move indices of the nodes
+            whose status is EXPANDING.
+    """
+
+    def __init__(self, capacity: int = 1 << 16, max_nodes: int = 1 << 24):
+        """Allocate an empty tree.
+
+        Args:
+            capacity: Number of nodes to preallocate.
+            max_nodes: Maximum number of nodes.
+        """
+        self.max_nodes = max_nodes
+        capacity = min(capacity, max_nodes)
+        self.move = array('i', [0]) * capacity
+        self.parent = array('i', [0]) * capacity
+        self.first_child = array('i', [0]) * capacity
+        self.next_sibling = array('i', [0]) * capacity
+        self.visits = array('i', [0]) * capacity
+        self.wins = array('d', [0.0]) * capacity
+        self.player = array('b', [0]) * capacity
+        self.status = array('b', [0]) * capacity
+        self.moves = []
+        self.move_index = {}
+        self.untried = {}
+        self.size = 0
+
+    def capacity(self) -> int:
+        """ Number of nodes that fit without growing the arrays. """
+        return len(self.move)
+
+    def clear(self):
+        """ Remove all nodes, keeping the allocated arrays. """
+        self.untried = {}
+        self.size = 0
+
+    def add_node(self, move, parent: int, player_just_moved: int) -> int:
+        """ Add a node as the first child of parent.
+
+        Args:
+            move: The move that got us to this node, None for the root.
+            parent: Index of the parent node, -1 for the root.
+            player_just_moved: The player that made move.
+
+        Returns:
+            Index of the new node, or -1 if the tree is full.
+        """
+        n = self.size
+        if n == len(self.move):
+            if not self.grow():
+                return -1
+        if move is None:
+            self.move[n] = -1
+        else:
+            self.move[n] = self.intern(move)
+        self.parent[n] = parent
+        self.first_child[n] = -1
+        self.visits[n] = 0
+        self.wins[n] = 0.0
+        self.player[n] = player_just_moved
+        self.status[n] = UNEXPANDED
+        if parent >= 0:
+            self.next_sibling[n] = self.first_child[parent]
+            self.first_child[parent] = n
+        else:
+            self.next_sibling[n] = -1
+        self.size = n + 1
+        return n
+
+    def grow(self) -> bool:
+        """ Double the capacity of the arrays, up to max_nodes.
+
+        Returns:
+            False if the tree is already at max_nodes.
+        """
+        old = len(self.move)
+        extra = min(old, self.max_nodes - old)
+        if extra <= 0:
+            return False
+        for a in (self.move, self.parent, self.first_child, self.next_sibling,
+                  self.visits, self.wins, self.player, self.status):
+            a.extend(a[:1] * extra)
+        return True
+
+    def intern(self, move) -> int:
+        """ Return the index of move in self.moves, adding it if new. """
+        i = self.move_index.get(move)
+        if i is None:
+            i = len(self.moves)
+            self.moves.append(move)
+            self.move_index[move] = i
+        return i
+
+    def get_move(self, node: int):
+        """ Return the move that led to node. """
+        return self.moves[self.move[node]]
+
+    def children(self, node: int) -> List[int]:
+        """ Return the children of node, most recently added first. """
+        result = []
+        c = self.first_child[node]
+        while c >= 0:
+            result.append(c)
+            c = self.next_sibling[c]
+        return result
+
+    def untried_moves(self, node: int, state: GameState) -> List[int]:
+        """ Return the untried move indices of node, generating them if needed.
+
+        Args:
+            node: A node.
+            state: The state at node.
+        """
+        status = self.status[node]
+        if status == UNEXPANDED:
+            moves = state.get_moves()
+            if moves == []:
+                self.status[node] = TERMINAL
+                return []
+            self.status[node] = EXPANDING
+            untried = [self.intern(m) for m in moves]
+            self.untried[node] = untried
+            return untried
+        elif status == EXPANDING:
+            return self.untried[node]
+        return []
+
+    def select_child(self, node: int) -> int:
+        """ Use the UCB1 formula to select a child node.
+
+        Same formula and tie breaking as play.Node.select_child.
+        """
+        visits = self.visits
+        wins = self.wins
+        log_visits = math.log(visits[node])
+        best = -1
+        best_value = -math.inf
+        c = self.first_child[node]
+        while c >= 0:
+            value = wins[c] / visits[c] + math.sqrt(2 * log_visits / visits[c])
+            # Children are newest first, so keeping the first of equal values
+            # picks the last added, like sorted(...)[-1].
+            if value > best_value:
+                best = c
+                best_value = value
+            c = self.next_sibling[c]
+        return best
+
+    def best_move(self, node: int = 0):
+        """ Return the move of the most visited child of node. """
+        best = -1
+        c = self.first_child[node]
+        while c >= 0:
+            if best < 0 or self.visits[c] > self.visits[best]:
+                best = c
+            c = self.next_sibling[c]
+        return self.get_move(best)
+
+
+def iterate(tree: CompactTree, rootstate: GameState, itermax: int):
+    """ Grow a CompactTree with UCT iterations.
+
+    Args:
+        tree: The tree. If empty, a root is created from rootstate.
+        rootstate: The state at the root (not modified).
+        itermax: Iterations to search.
+    """
+    if tree.size == 0:
+        tree.add_node(None, -1, rootstate.player_just_moved)
+    status = tree.status
+    for i in range(itermax):
+        node = 0
+        state = rootstate.clone()
+
+        # Select
+        while status[node] == EXPANDED:
+            node = tree.select_child(node)
+            state.do_move(tree.get_move(node))
+
+        # Expand
+        untried = tree.untried_moves(node, state)
+        if untried != []:
+            m = random.choice(untried)
+            state.do_move(tree.moves[m])
+            child = tree.add_node(tree.moves[m], node,
+                                  state.player_just_moved)
+            if child >= 0:
+                untried.remove(m)
+                if untried == []:
+                    status[node] = EXPANDED
+                    del tree.untried[node]
+                node = child
+
+        # Rollout
+        state.do_random_rollout(random)
+
+        # Backpropagate
+        while node >= 0:
+            tree.visits[node] += 1
+            tree.wins[node] += state.get_result(tree.player[node])
+            node = tree.parent[node]
+
+
+def search(rootstate: GameState, itermax: int, tree: CompactTree = None,
+           verbose=False) -> 'Move':
+    """ Do a UCT search using a CompactTree.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Iterations to search.
+        tree: The tree to use; it is cleared first, so one tree can be used
+            for every move of a game without reallocating. Default is a new
+            CompactTree.
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    if tree is None:
+        tree = CompactTree()
+    else:
+        tree.clear()
+    iterate(tree, rootstate, itermax)
+    if verbose:
+        print('Nodes:', tree.size, 'of', tree.capacity())
+    return tree.best_move()
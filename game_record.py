@@ -0,0 +1,323 @@
+"""
+Compact binary game records.
+
+A game record file holds any number of games of one GameState class, one
+byte per move, written by appending so games can be streamed to it as they
+finish:
+
+    header   magic b'MCTR', version (uint16), squares on the board (uint16),
+             GameState class name (32 bytes, null padded), little endian
+    games    for each game: strength of player 1 and of player 2 (uint32
+             each, 0 if unknown), seed (uint64), winner (uint8, 1 or 2, or
+             0 for a draw), number of moves n (uint16), then n moves of one
+             byte (the square, or 9 * sub_board + square for SuperTicTacToe)
+
+read_games() streams the games of a file and GameRecord.states() replays a
+game lazily. GameArchive gives random access to game N through an index of
+record offsets (uint64, native byte order), kept next to the data in
+PATH.idx, memory-mapped and brought up to date with games appended since it
+was written.
+
+Typical use:
+
+    with GameRecordWriter('games.bin', SuperTicTacToe) as record:
+        play.play_game(SuperTicTacToe(), 1000, 100, record=record)
+    for game in read_games('games.bin'):
+        final = game.final_state()
+
+Running this module with --check writes, reads back and appends to a file of
+each GameState class.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Iterator, List
+
+import game_state
+from game_state import GameState, move_to_index, index_to_move
+
+MAGIC = b'MCTR'
+VERSION = 2
+HEADER = struct.Struct('<4sHH32s')
+# Longest GameState class name the header can hold.
+NAME_SIZE = 32
+RECORD = struct.Struct('<IIQBH')
+
+INDEX_MAGIC = b'MCTX'
+# Index header: magic, and the size of the data file the index covers.
+INDEX_HEADER = struct.Struct('<4sQ')
+
+
+def _squares(game: type) -> int:
+    """ Squares on the board of a GameState class, 9 or 81. """
+    return 9 if issubclass(game, game_state.TicTacToe) else 81
+
+
+def _read_header(data: bytes, path: str) -> type:
+    """ Check a file header and return its GameState class. """
+    if len(data) < HEADER.size:
+        raise ValueError(path + ' is not a game record file')
+    magic, version, squares, name = HEADER.unpack_from(data, 0)
+    game = getattr(game_state, name.rstrip(b'\0').decode('ascii'), None)
+    if magic != MAGIC or version != VERSION or game is None:
+        raise ValueError(path + ' is not a game record file')
+    return game
+
+
+class GameRecord:
+    """ One recorded game.
+
+    Attributes:
+        game (type): The GameState class.
+        strengths (Tuple[int, int]): Strengths of players 1 and 2.
+        seed (int): Random seed the game was played with.
+        winner (int): 1 or 2, or 0 for a draw.
+        moves (bytes): The moves, one byte each.
+    """
+
+    def __init__(self, game: type, strengths, seed: int, winner: int,
+                 moves: bytes):
+        self.game = game
+        self.strengths = strengths
+        self.seed = seed
+        self.winner = winner
+        self.moves = moves
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def moves_played(self) -> List['Move']:
+        """ The moves, decoded. """
+        squares = _squares(self.game)
+        return [index_to_move(i, squares) for i in self.moves]
+
+    def states(self) -> Iterator[GameState]:
+        """ Replay the game, yielding the state after each move.
+
+        The same state is updated in place and yielded each time; clone it to
+        keep a position.
+        """
+        state = self.game()
+        for m in self.moves_played():
+            state.do_move(m)
+            yield state
+
+    def final_state(self) -> GameState:
+        """ The state at the end of the game. """
+        state = self.game()
+        for state in self.states():
+            pass
+        return state
+
+
+class GameRecordWriter:
+    """ Appends games to a game record file, creating it if needed. """
+
+    def __init__(self, path: str, game: type = game_state.SuperTicTacToe):
+        name = game.__name__.encode('ascii')
+        if len(name) > NAME_SIZE:
+            raise ValueError('class name %s is longer than %d bytes' %
+                             (game.__name__, NAME_SIZE))
+        self.path = path
+        self.game = game
+        self.file = open(path, 'ab+')
+        self.file.seek(0)
+        header = self.file.read(HEADER.size)
+        if header:
+            if _read_header(header, path) is not game:
+                self.file.close()
+                raise ValueError(path + ' holds games of another class')
+        else:
+            self.file.write(HEADER.pack(MAGIC, VERSION, _squares(game), name))
+
+    def write(self, moves: List['Move'], winner: int, strengths=(0, 0),
+              seed: int = 0):
+        """ Append a game.
+
+        Args:
+            moves: The moves played.
+            winner: 1 or 2, or 0 for a draw.
+            strengths: Strengths of players 1 and 2; None is stored as 0.
+            seed: Random seed the game was played with.
+        """
+        self.file.write(RECORD.pack(strengths[0] or 0, strengths[1] or 0,
+                                    seed, winner, len(moves)))
+        self.file.write(bytes(move_to_index(m) for m in moves))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> 'GameRecordWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parse_record(data, offset: int, game: type) -> GameRecord:
+    """ The game whose record starts at offset in data. """
+    p1, p2, seed, winner, n = RECORD.unpack_from(data, offset)
+    start = offset + RECORD.size
+    return GameRecord(game, (p1, p2), seed, winner,
+                      bytes(data[start:start + n]))
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """ Stream the games of a game record file, in order. """
+    with open(path, 'rb') as f:
+        game = _read_header(f.read(HEADER.size), path)
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            n = RECORD.unpack(header)[4]
+            moves = f.read(n)
+            if len(moves) < n:
+                return
+            yield _parse_record(header + moves, 0, game)
+
+
+def _update_index(path: str) -> str:
+    """ Bring the index of a game record file up to date.
+
+    Returns:
+        The path of the index file.
+    """
+    index_path = path + '.idx'
+    size = os.path.getsize(path)
+    offsets = array('Q')
+    covered = HEADER.size
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) == INDEX_HEADER.size:
+                magic, end = INDEX_HEADER.unpack(header)
+                if magic == INDEX_MAGIC and end == size:
+                    return index_path
+                if magic == INDEX_MAGIC and end < size:
+                    offsets.frombytes(f.read())
+                    covered = end
+
+    with open(path, 'rb') as f:
+        f.seek(covered)
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            n = RECORD.unpack(header)[4]
+            if len(f.read(n)) < n:
+                break
+            offsets.append(covered)
+            covered += RECORD.size + n
+    with open(index_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, covered))
+        f.write(offsets.tobytes())
+    return index_path
+
+
+class GameArchive:
+    """ Random access to the games of a game record file.
+
+    Both the data file and its index are memory-mapped, so opening an
+    archive reads only the games appended since the index was last updated.
+    """
+
+    def __init__(self, path: str):
+        index_path = _update_index(path)
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.game = _read_header(self.map, path)
+        with open(index_path, 'rb') as f:
+            self.index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = memoryview(self.index_map)[INDEX_HEADER.size:].cast(
+            'Q')
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, n: int) -> GameRecord:
+        """ Return game n (counting from 0). """
+        return _parse_record(self.map, self.offsets[n], self.game)
+
+    def close(self):
+        """ Unmap the files. """
+        self.offsets.release()
+        self.index_map.close()
+        self.map.close()
+
+    def __enter__(self) -> 'GameArchive':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_round_trip(game: type, path: str, games: int = 5, seed: int = 0):
+    """ Write seeded random games of a GameState class to a new file, and
+    check that read_games(), GameArchive and appending give them back.
+
+    Raises:
+        AssertionError if they do not.
+    """
+    rng = random.Random(seed)
+    played = []
+    for i in range(games):
+        state = game()
+        moves = []
+        while state.has_moves():
+            moves.append(state.get_random_move(rng))
+            state.do_move(moves[-1])
+        winner = 0
+        if state.get_result(1) != 0.5:
+            winner = 1 if state.get_result(1) == 1.0 else 2
+        played.append((moves, winner, repr(state)))
+
+    if os.path.exists(path):
+        os.remove(path)
+    half = games // 2
+    for part in (played[:half], played[half:]):
+        # The second part is appended to the file written by the first.
+        with GameRecordWriter(path, game) as record:
+            for i, (moves, winner, board) in enumerate(part):
+                record.write(moves, winner, seed=i)
+
+    read = list(read_games(path))
+    with GameArchive(path) as archive:
+        assert len(read) == len(archive) == games
+        for i, (moves, winner, board) in enumerate(played):
+            for g in (read[i], archive[i]):
+                assert g.game is game
+                assert g.moves_played() == moves
+                assert g.winner == winner
+                assert repr(g.final_state()) == board
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--check', action='store_true',
+                        help='check the round trip of each game class')
+    parser.add_argument('--dir', default=tempfile.gettempdir(),
+                        help='where to write the check files')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        for game in (game_state.TicTacToe, game_state.SuperTicTacToe,
+                     game_state.BitboardSuperTicTacToe):
+            path = os.path.join(args.dir, 'check_' + game.__name__ + '.bin')
+            check_round_trip(game, path)
+            for p in (path, path + '.idx'):
+                os.remove(p)
+            print(game.__name__, 'ok')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
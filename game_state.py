@@ -24,8 +24,9 @@ so long as this comment remains in any distributed code.
 For more information about Monte Carlo Tree Search check out our web site at
 www.mcts.ai
 """
+import bisect
+import random
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from typing import List, Tuple
 
 
@@ -63,6 +64,17 @@ class GameState(ABC):
         """
         pass
 
+    def undo_move(self, move: 'Move'):
+        """ Take back the given move, which must be the last move done (and
+        not yet taken back), restoring the state from before do_move(move).
+
+        Lets a search walk one state down and back up its tree instead of
+        cloning the state for every iteration. Games that cannot undo moves
+        do not override this.
+        """
+        raise NotImplementedError(type(self).__name__ +
+                                  ' cannot undo moves')
+
     @abstractmethod
     def get_moves(self) -> List['Move']:
         """Get all possible moves from this state.
@@ -90,6 +102,59 @@ class GameState(ABC):
         """
         pass
 
+    def has_moves(self) -> bool:
+        """Check if there is any legal move, i.e. get_moves() != [].
+
+        The default implementation builds the list of moves; subclasses
+        should override it with something cheaper.
+        """
+        return self.get_moves() != []
+
+    def is_terminal(self) -> bool:
+        """Check if the game is over (there are no legal moves)."""
+        return not self.has_moves()
+
+    def empty_squares(self) -> int:
+        """Get the number of empty squares that can still be marked.
+
+        This bounds the number of moves left in the game, which tells a
+        solver whether the rest of the game is small enough to search
+        exactly.
+
+        Returns:
+            The number of squares, or None if not known for this game.
+        """
+        return None
+
+    def get_random_move(self, rng=random) -> 'Move':
+        """Get a uniformly random move from this state.
+
+        The default implementation picks from get_moves(). Subclasses should
+        override this with something quicker, but must pick the same move as
+        rng.choice(self.get_moves()) so that seeded games are reproducible.
+
+        Args:
+            rng: Source of randomness (the random module or a random.Random).
+
+        Returns:
+            A random legal move, or None if the game is over.
+        """
+        moves = self.get_moves()
+        if moves == []:
+            return None
+        return rng.choice(moves)
+
+    def do_random_rollout(self, rng=random):
+        """Play random moves until the game is over.
+
+        Args:
+            rng: Source of randomness (the random module or a random.Random).
+        """
+        move = self.get_random_move(rng)
+        while move is not None:
+            self.do_move(move)
+            move = self.get_random_move(rng)
+
     @abstractmethod
     def __repr__(self):
         pass
@@ -128,6 +193,12 @@ class TicTacToe(GameState):
         self.player_just_moved = 3 - self.player_just_moved
         self.board[move] = self.player_just_moved
 
+    def undo_move(self, move: int):
+        """ Take back the given move, which must be the last move done. """
+        assert self.board[move] == self.player_just_moved
+        self.board[move] = 0
+        self.player_just_moved = 3 - self.player_just_moved
+
     def get_moves(self) -> List[int]:
         """ Get all possible moves from this state.
 
@@ -136,6 +207,30 @@ class TicTacToe(GameState):
         """
         return [i for i in range(9) if self.board[i] == 0]
 
+    def has_moves(self) -> bool:
+        """ Check if there is any empty square. """
+        return 0 in self.board
+
+    def empty_squares(self) -> int:
+        """ Get the number of empty squares. """
+        return self.board.count(0)
+
+    def get_random_move(self, rng=random) -> int:
+        """ Get a random empty square without building the list of moves.
+
+        Picks the same square as rng.choice(self.get_moves()).
+        """
+        board = self.board
+        empty = 9 - board.count(1) - board.count(2)
+        if empty == 0:
+            return None
+        k = rng.randrange(empty)
+        for i in range(9):
+            if board[i] == 0:
+                if k == 0:
+                    return i
+                k -= 1
+
     def get_result(self, player: int) -> float:
         """Get the game result from the viewpoint of player.
 
@@ -169,6 +264,16 @@ class TicTacToe(GameState):
         return s
 
 
+# Zobrist keys for the SuperTicTacToe games: one per (player, square), one per
+# value of last_square_played and one for the side to move. A fixed seed keeps
+# hashes the same from run to run.
+_zobrist_rng = random.Random(2012)
+_ZOBRIST_SQUARES = [[_zobrist_rng.getrandbits(64) for i in range(81)]
+                    for player in range(3)]
+_ZOBRIST_LAST = [_zobrist_rng.getrandbits(64) for i in range(9)]
+_ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+
+
 class SuperTicTacToe(GameState):
     """ The state of a 'super tic tac toe' game (the board).
 
@@ -203,6 +308,24 @@ class SuperTicTacToe(GameState):
         last_square_played (int): The index of the last square played in
             sub board. Needed because this index specifies the sub board that
             the next player must mark (if available for marking).
+
+        zobrist (int): 64 bit Zobrist hash of the board, the side to move and
+            last_square_played, updated incrementally by do_move().
+
+        sub_board_winner (List[int]): The player (1 or 2) that has won each
+            sub board, 0 if none.
+
+        free_squares (List[List[int]]): The empty squares of each sub board,
+            in ascending order. Their number is len(free_squares[sub_board]).
+
+        open_sub_boards (List[int]): The sub boards that are available for
+            writing (not won and not full), in ascending order.
+
+        The last three are kept up to date by do_move(), so that generating
+        moves does not need to scan the board.
+
+        history (List[int]): last_square_played before each move done, for
+            undo_move().
     """
 
     def __init__(self):
@@ -215,15 +338,25 @@ class SuperTicTacToe(GameState):
         self.sub_boards_won = [0, 0, 0]
         self.squares_played = 0
         self.last_square_played = 0
+        self.zobrist = _ZOBRIST_LAST[0]
+        self.sub_board_winner = [0] * 9
+        self.free_squares = [list(range(9)) for i in range(9)]
+        self.open_sub_boards = list(range(9))
+        self.history = []
 
     def clone(self):
         """ Create a deep clone of this game state. """
         state = SuperTicTacToe()
         state.player_just_moved = self.player_just_moved
-        state.board = deepcopy(self.board)
-        state.sub_boards_won = deepcopy(self.sub_boards_won)
+        state.board = [sub[:] for sub in self.board]
+        state.sub_boards_won = self.sub_boards_won[:]
         state.squares_played = self.squares_played
-        state.last_square_played = 0
+        state.last_square_played = self.last_square_played
+        state.zobrist = self.zobrist
+        state.sub_board_winner = self.sub_board_winner[:]
+        state.free_squares = [free[:] for free in self.free_squares]
+        state.open_sub_boards = self.open_sub_boards[:]
+        state.history = self.history[:]
         return state
 
     def do_move(self, move: (int, int)):
@@ -240,14 +373,48 @@ class SuperTicTacToe(GameState):
 
         # Update state of board.
         self.player_just_moved = 3 - self.player_just_moved
+        self.zobrist ^= (_ZOBRIST_SQUARES[self.player_just_moved][
+            9 * sub_board + square] ^ _ZOBRIST_LAST[self.last_square_played] ^
+            _ZOBRIST_LAST[square] ^ _ZOBRIST_SIDE)
+        self.history.append(self.last_square_played)
         self.last_square_played = square
         self.squares_played += 1
         self.board[sub_board][square] = self.player_just_moved
+        free = self.free_squares[sub_board]
+        free.remove(square)
 
         # Check if player has won a sub_board (tic tac toe game).
         result = self.wins_sub_board(self.player_just_moved, sub_board)
         if result:
             self.sub_boards_won[self.player_just_moved] += 1
+            self.sub_board_winner[sub_board] = self.player_just_moved
+        if (result or free == []) and sub_board in self.open_sub_boards:
+            self.open_sub_boards.remove(sub_board)
+
+    def undo_move(self, move: (int, int)):
+        """ Take back the given move, which must be the last move done.
+
+        The sub board of a legal move was open before it, so if it is won or
+        closed now, the move won or filled it.
+        """
+        sub_board = move[0]
+        square = move[1]
+        player = self.player_just_moved
+        assert self.board[sub_board][square] == player
+        previous = self.history.pop()
+        self.zobrist ^= (_ZOBRIST_SQUARES[player][9 * sub_board + square] ^
+                         _ZOBRIST_LAST[previous] ^ _ZOBRIST_LAST[square] ^
+                         _ZOBRIST_SIDE)
+        self.last_square_played = previous
+        self.squares_played -= 1
+        self.board[sub_board][square] = 0
+        bisect.insort(self.free_squares[sub_board], square)
+        if self.sub_board_winner[sub_board]:
+            self.sub_boards_won[player] -= 1
+            self.sub_board_winner[sub_board] = 0
+        if sub_board not in self.open_sub_boards:
+            bisect.insort(self.open_sub_boards, sub_board)
+        self.player_just_moved = 3 - player
 
     def sub_board_is_available(self, sub_board) -> bool:
         """Check if a sub_board is available for writing.
@@ -258,17 +425,21 @@ class SuperTicTacToe(GameState):
         Returns:
             True if sub board can be written.
         """
-        # If won or lost, it's dead, can't be written anymore.
-        if self.wins_sub_board(1, sub_board):
-            return False
-        if self.wins_sub_board(2, sub_board):
+        # If won or lost, or all squares filled, it's dead, can't be written
+        # anymore.
+        return (self.sub_board_winner[sub_board] == 0 and
+                self.free_squares[sub_board] != [])
+
+    def has_moves(self) -> bool:
+        """ Check if there is any legal move, without building the list. """
+        if self.sub_boards_won[1] == 3 or self.sub_boards_won[2] == 3:
             return False
+        return self.open_sub_boards != []
 
-        # If all squares filled, it's dead, can't be written anymore.
-        for i in range(9):
-            if self.board[sub_board][i] == 0:
-                return True
-        return False
+    def empty_squares(self) -> int:
+        """ Get the number of empty squares in the open sub boards. """
+        return sum(len(self.free_squares[sub_board])
+                   for sub_board in self.open_sub_boards)
 
     def get_moves(self) -> List[Tuple[int]]:
         """ Get all possible moves from this state.
@@ -290,21 +461,42 @@ class SuperTicTacToe(GameState):
             return moves
         elif self.sub_board_is_available(self.last_square_played):
             # Only squares in sub_board are legal.
-            moves = []
-            for i in range(9):
-                if self.board[self.last_square_played][i] == 0:
-                    moves.append((self.last_square_played, i))
-            return moves
+            sub_board = self.last_square_played
+            return [(sub_board, i) for i in self.free_squares[sub_board]]
         else:
             # Any square in any available sub board is legal
             moves = []
-            for sub_board in range(9):
-                if self.sub_board_is_available(sub_board):
-                    for i in range(9):
-                        if self.board[sub_board][i] == 0:
-                            moves.append((sub_board, i))
+            for sub_board in self.open_sub_boards:
+                for i in self.free_squares[sub_board]:
+                    moves.append((sub_board, i))
             return moves
 
+    def get_random_move(self, rng=random) -> Tuple[int]:
+        """ Get a random legal move without building the list of moves.
+
+        Picks the same move as rng.choice(self.get_moves()).
+        """
+        if self.sub_boards_won[1] == 3 or self.sub_boards_won[2] == 3:
+            return None
+        elif self.squares_played == 0:
+            k = rng.randrange(81)
+            return (k // 9, k % 9)
+        sub_board = self.last_square_played
+        free = self.free_squares[sub_board]
+        if free and self.sub_board_winner[sub_board] == 0:
+            return (sub_board, free[rng.randrange(len(free))])
+        empty = 0
+        for sub_board in self.open_sub_boards:
+            empty += len(self.free_squares[sub_board])
+        if empty == 0:
+            return None
+        k = rng.randrange(empty)
+        for sub_board in self.open_sub_boards:
+            free = self.free_squares[sub_board]
+            if k < len(free):
+                return (sub_board, free[k])
+            k -= len(free)
+
     def get_result(self, player: int):
         """Get the result of the game from the viewpoint of player.
 
@@ -395,3 +587,346 @@ class SuperTicTacToe(GameState):
         s += '\n\n'
         return s
 
+
+# Lookup tables for BitboardSuperTicTacToe, also used by other modules. A sub
+# board is a 9 bit mask where bit i is set if square i is marked.
+
+# LINES are the lines of a 3 x 3 board, and LINE_MASKS their masks.
+LINES = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8),
+         (0, 4, 8), (2, 4, 6)]
+LINE_MASKS = [(1 << x) | (1 << y) | (1 << z) for (x, y, z) in LINES]
+
+# WINS[mask] is True if the marks in mask contain a complete line.
+WINS = [any(mask & line == line for line in LINE_MASKS)
+        for mask in range(512)]
+
+# _SQUARES[mask] lists the squares set in mask, in ascending order.
+_SQUARES = [tuple(i for i in range(9) if mask & (1 << i)) for mask in range(512)]
+
+# _SUB_BOARD_MOVES[sub_board][free] lists the moves in sub_board given the
+# mask of its free squares, in the same order as SuperTicTacToe.get_moves().
+_SUB_BOARD_MOVES = [[[(sub_board, i) for i in _SQUARES[free]]
+                     for free in range(512)]
+                    for sub_board in range(9)]
+
+_ALL_MOVES = [(i, j) for i in range(9) for j in range(9)]
+
+_FULL_BOARD = (1 << 81) - 1
+
+# _CLOSED_SQUARES[closed] has all 9 squares of each sub board in the 9 bit
+# mask closed set.
+_CLOSED_SQUARES = [sum(511 << (9 * i) for i in range(9) if closed & (1 << i))
+                   for closed in range(512)]
+
+
+class BitboardSuperTicTacToe(GameState):
+    """ A 'super tic tac toe' game state packed into integer bitboards.
+
+    Plays exactly the same game as SuperTicTacToe (the same moves are
+    generated in the same order), but the marks of each player are kept in a
+    single 81 bit integer, so clone(), do_move() and get_result() do a
+    constant amount of work and the win check is a table lookup.
+
+    Attributes:
+        marks (List[int]): marks[player] is the bitboard of squares marked by
+            player (1 or 2); marks[0] is unused. Square (sub_board, square)
+            is bit 9 * sub_board + square.
+
+        closed (int): 9 bit mask of the sub boards that can no longer be
+            written because they have been won or are full.
+
+        sub_boards_won (List[int]): The number of 'sub boards' (tic tac toe
+            games) won by the two players.
+
+        squares_played (int): The number of squares that have been marked with
+            an 'X' or an 'O'.
+
+        last_square_played (int): The index of the last square played in
+            sub board. Needed because this index specifies the sub board that
+            the next player must mark (if available for marking).
+
+        zobrist (int): 64 bit Zobrist hash of the board, the side to move and
+            last_square_played, updated incrementally by do_move().
+
+        history (List[int]): last_square_played before each move done, for
+            undo_move().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.marks = [0, 0, 0]
+        self.closed = 0
+        self.sub_boards_won = [0, 0, 0]
+        self.squares_played = 0
+        self.last_square_played = 0
+        self.zobrist = _ZOBRIST_LAST[0]
+        self.history = []
+
+    def clone(self):
+        """ Create a deep clone of this game state. """
+        state = BitboardSuperTicTacToe()
+        state.player_just_moved = self.player_just_moved
+        state.marks = self.marks[:]
+        state.closed = self.closed
+        state.sub_boards_won = self.sub_boards_won[:]
+        state.squares_played = self.squares_played
+        state.last_square_played = self.last_square_played
+        state.zobrist = self.zobrist
+        state.history = self.history[:]
+        return state
+
+    def do_move(self, move: (int, int)):
+        """ Update state by carrying out the given move.
+
+        Args:
+            move: The (sub_board, square) indices for the square to be marked
+                with an 'X' or an 'O'.
+        """
+        assert len(move) == 2
+        sub_board = move[0]
+        square = move[1]
+        shift = 9 * sub_board
+        bit = 1 << (shift + square)
+        marks = self.marks
+        assert not (marks[1] | marks[2]) & bit
+
+        # Update state of board.
+        player = 3 - self.player_just_moved
+        self.player_just_moved = player
+        self.zobrist ^= (_ZOBRIST_SQUARES[player][shift + square] ^
+                         _ZOBRIST_LAST[self.last_square_played] ^
+                         _ZOBRIST_LAST[square] ^ _ZOBRIST_SIDE)
+        self.history.append(self.last_square_played)
+        self.last_square_played = square
+        self.squares_played += 1
+        marks[player] |= bit
+
+        # Check if player has won or filled the sub_board.
+        if WINS[(marks[player] >> shift) & 511]:
+            self.sub_boards_won[player] += 1
+            self.closed |= 1 << sub_board
+        elif ((marks[1] | marks[2]) >> shift) & 511 == 511:
+            self.closed |= 1 << sub_board
+
+    def undo_move(self, move: (int, int)):
+        """ Take back the given move, which must be the last move done.
+
+        The sub board of a legal move was open before it, so if it is closed
+        now, the move won or filled it.
+        """
+        sub_board = move[0]
+        square = move[1]
+        shift = 9 * sub_board
+        player = self.player_just_moved
+        marks = self.marks
+        assert marks[player] >> (shift + square) & 1
+        if (self.closed >> sub_board) & 1:
+            if WINS[(marks[player] >> shift) & 511]:
+                self.sub_boards_won[player] -= 1
+            self.closed &= ~(1 << sub_board)
+        marks[player] &= ~(1 << (shift + square))
+        previous = self.history.pop()
+        self.zobrist ^= (_ZOBRIST_SQUARES[player][shift + square] ^
+                         _ZOBRIST_LAST[previous] ^ _ZOBRIST_LAST[square] ^
+                         _ZOBRIST_SIDE)
+        self.last_square_played = previous
+        self.squares_played -= 1
+        self.player_just_moved = 3 - player
+
+    def free_squares(self, sub_board: int) -> int:
+        """Get the 9 bit mask of the empty squares in a sub board."""
+        shift = 9 * sub_board
+        return ~((self.marks[1] | self.marks[2]) >> shift) & 511
+
+    def sub_board_is_available(self, sub_board) -> bool:
+        """Check if a sub_board is available for writing.
+
+        Args:
+            sub_board: Index of desired sub board.
+
+        Returns:
+            True if sub board can be written.
+        """
+        return not (self.closed >> sub_board) & 1
+
+    def has_moves(self) -> bool:
+        """ Check if there is any legal move, without building the list. """
+        if self.sub_boards_won[1] == 3 or self.sub_boards_won[2] == 3:
+            return False
+        return self.closed != 511
+
+    def empty_squares(self) -> int:
+        """ Get the number of empty squares in the open sub boards. """
+        taken = self.marks[1] | self.marks[2] | _CLOSED_SQUARES[self.closed]
+        return (~taken & _FULL_BOARD).bit_count()
+
+    def get_moves(self) -> List[Tuple[int]]:
+        """ Get all possible moves from this state.
+
+        Returns:
+            A list of possible moves. A move is an (int, int) tuple where the
+            first value is the index of the sub_board (tic tac toe game) and the
+            second value is the index of the square in that game to be marked.
+        """
+        if self.sub_boards_won[1] == 3 or self.sub_boards_won[2] == 3:
+            # Game over, someone has already won.
+            return []
+        elif self.squares_played == 0:
+            # All squares are eligible to be marked.
+            return _ALL_MOVES[:]
+        elif not (self.closed >> self.last_square_played) & 1:
+            # Only squares in sub_board are legal.
+            sub_board = self.last_square_played
+            return _SUB_BOARD_MOVES[sub_board][self.free_squares(sub_board)][:]
+        else:
+            # Any square in any available sub board is legal
+            moves = []
+            for sub_board in range(9):
+                if not (self.closed >> sub_board) & 1:
+                    moves += _SUB_BOARD_MOVES[sub_board][
+                        self.free_squares(sub_board)]
+            return moves
+
+    def get_random_move(self, rng=random) -> Tuple[int]:
+        """ Get a random legal move without building the list of moves.
+
+        Picks the same move as rng.choice(self.get_moves()).
+        """
+        if self.sub_boards_won[1] == 3 or self.sub_boards_won[2] == 3:
+            return None
+        elif self.squares_played == 0:
+            return _ALL_MOVES[rng.randrange(81)]
+        taken = self.marks[1] | self.marks[2]
+        sub_board = self.last_square_played
+        if not (self.closed >> sub_board) & 1:
+            # Only squares in sub_board are legal.
+            free = ~(taken >> (9 * sub_board)) & 511
+            squares = _SQUARES[free]
+            return (sub_board, squares[rng.randrange(len(squares))])
+        # Any square in any available sub board is legal.
+        free = ~(taken | _CLOSED_SQUARES[self.closed]) & _FULL_BOARD
+        empty = free.bit_count()
+        if empty == 0:
+            return None
+        k = rng.randrange(empty)
+        for sub_board in range(9):
+            squares = _SQUARES[(free >> (9 * sub_board)) & 511]
+            if k < len(squares):
+                return (sub_board, squares[k])
+            k -= len(squares)
+
+    def do_random_rollout(self, rng=random):
+        """Play random moves until the game is over.
+
+        Equivalent to the GameState implementation, with get_random_move()
+        and do_move() inlined.
+        """
+        marks = self.marks
+        sub_boards_won = self.sub_boards_won
+        history = self.history
+        randrange = rng.randrange
+        while sub_boards_won[1] != 3 and sub_boards_won[2] != 3:
+            taken = marks[1] | marks[2]
+            sub_board = self.last_square_played
+            if self.squares_played == 0:
+                sub_board, square = _ALL_MOVES[randrange(81)]
+            elif not (self.closed >> sub_board) & 1:
+                squares = _SQUARES[~(taken >> (9 * sub_board)) & 511]
+                square = squares[randrange(len(squares))]
+            else:
+                free = ~(taken | _CLOSED_SQUARES[self.closed]) & _FULL_BOARD
+                empty = free.bit_count()
+                if empty == 0:
+                    return
+                k = randrange(empty)
+                for sub_board in range(9):
+                    squares = _SQUARES[(free >> (9 * sub_board)) & 511]
+                    if k < len(squares):
+                        square = squares[k]
+                        break
+                    k -= len(squares)
+            shift = 9 * sub_board
+            player = 3 - self.player_just_moved
+            self.player_just_moved = player
+            self.zobrist ^= (_ZOBRIST_SQUARES[player][shift + square] ^
+                             _ZOBRIST_LAST[self.last_square_played] ^
+                             _ZOBRIST_LAST[square] ^ _ZOBRIST_SIDE)
+            history.append(self.last_square_played)
+            self.last_square_played = square
+            self.squares_played += 1
+            marks[player] |= 1 << (shift + square)
+            if WINS[(marks[player] >> shift) & 511]:
+                sub_boards_won[player] += 1
+                self.closed |= 1 << sub_board
+            elif ((taken >> shift) & 511) | (1 << square) == 511:
+                self.closed |= 1 << sub_board
+
+    def get_result(self, player: int):
+        """Get the result of the game from the viewpoint of player.
+
+        Args:
+            player: 1 or 2
+
+        Returns:
+            1.0 if player wins, 0.0 if player loses, 0.5 for a draw.
+
+        """
+        if self.sub_boards_won[player] == 3:
+            return 1.0
+        elif self.sub_boards_won[3 - player] == 3:
+            return 0.0
+        else:
+            return 0.5
+
+    def wins_sub_board(self, player: int, sub_board: int) -> bool:
+        """Check if a player has won a sub board (tic tac toe game).
+
+        Args:
+            player: 1 or 2
+            sub_board: The index of the sub_board to check (0 - 8)
+
+        Returns:
+            True if player has won the sub board.
+
+        """
+        assert player == 1 or player == 2
+        return WINS[(self.marks[player] >> (9 * sub_board)) & 511]
+
+    def __repr__(self):
+        """ Return a string representation of the board. """
+        s = ""
+        for row in range(9):
+            for col in range(9):
+                bit = 1 << (9 * (3 * (row // 3) + col // 3) +
+                            3 * (row % 3) + col % 3)
+                if self.marks[1] & bit:
+                    s += 'X'
+                elif self.marks[2] & bit:
+                    s += 'O'
+                else:
+                    s += '.'
+                if col % 3 == 2:
+                    s += ' '
+            s += '\n'
+            if row % 3 == 2:
+                s += '\n'
+        s += '\n'
+        return s
+
+
+def move_to_index(move) -> int:
+    """ Encode a move as one byte: the square, or 9 * sub_board + square for
+    the SuperTicTacToe games.
+    """
+    if isinstance(move, tuple):
+        return 9 * move[0] + move[1]
+    return move
+
+
+def index_to_move(index: int, squares: int):
+    """ Decode a move encoded by move_to_index, for a board of 9 or 81
+    squares.
+    """
+    if squares == 81:
+        return (index // 9, index % 9)
+    return index
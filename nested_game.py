@@ -0,0 +1,324 @@
+"""
+A configurable engine for N x N, K in a row games, flat or nested.
+
+Rules describe a game: the board is size x size squares and a player wins a
+board by marking k squares in a row (across, down or diagonally). A nested
+game has size x size sub boards of that kind, played as in SuperTicTacToe:
+the first move may be anywhere, after which a player must play in the sub
+board matching the last square played if it is still open (not won and not
+full), and anywhere open otherwise. The game is won by winning
+sub_boards_to_win sub boards, or with meta_line by winning k sub boards in a
+row.
+
+NestedGame is a GameState for any Rules. The lines of a board are compiled
+once per (size, k) into bit masks, with an index of the lines through each
+square, so checking a move for a win looks only at the lines through its
+square.
+
+The existing games are instances: NestedGame(TIC_TAC_TOE) plays like
+TicTacToe (including its rule that play goes on until the board is full, the
+first complete line in the order rows, columns, diagonals deciding the
+result), and NestedGame(SUPER_TIC_TAC_TOE) like SuperTicTacToe; they generate
+the same moves in the same order, so seeded searches play the same games.
+Other games are in the GAMES registry, and register() adds more:
+
+    state = new_game('gomoku')
+"""
+from typing import Dict, List, Tuple
+
+from game_state import GameState
+
+_line_table_cache = {}
+
+
+def line_tables(size: int, k: int) -> Tuple[List[int], List[List[int]]]:
+    """ The lines of a size x size board, k in a row.
+
+    Returns:
+        (lines, lines_through): the bit mask of each line (rows, then
+        columns, then diagonals, then anti-diagonals, each in board order),
+        and for each square the masks of the lines through it.
+    """
+    key = (size, k)
+    if key not in _line_table_cache:
+        lines = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(size):
+                for c in range(size):
+                    end_r = r + dr * (k - 1)
+                    end_c = c + dc * (k - 1)
+                    if 0 <= end_r < size and 0 <= end_c < size:
+                        lines.append(sum(1 << (size * (r + dr * i) + c + dc * i)
+                                         for i in range(k)))
+        lines_through = [[line for line in lines if (line >> square) & 1]
+                         for square in range(size * size)]
+        _line_table_cache[key] = (lines, lines_through)
+    return _line_table_cache[key]
+
+
+class Rules:
+    """ The rules of a nested N x N, K in a row game.
+
+    Attributes:
+        size (int): Side of a board.
+        k (int): Marks in a row needed to win a board.
+        nested (bool): True => size x size sub boards, SuperTicTacToe style.
+        sub_boards_to_win (int): Sub boards a player must win to win a nested
+            game.
+        meta_line (bool): True => a nested game is won by k sub boards in a
+            row instead.
+        stop_at_win (bool): False => a flat game goes on until the board is
+            full, and the first complete line decides it (as TicTacToe).
+        squares (int): Squares on a board.
+        sub_boards (int): Boards in the game, 1 if flat.
+        lines (List[int]): Bit masks of the lines of a board.
+        lines_through (List[List[int]]): The lines through each square.
+    """
+
+    def __init__(self, size: int = 3, k: int = 3, nested: bool = False,
+                 sub_boards_to_win: int = None, meta_line: bool = False,
+                 stop_at_win: bool = True):
+        if nested and sub_boards_to_win is None and not meta_line:
+            raise ValueError('a nested game needs sub_boards_to_win or '
+                             'meta_line')
+        self.size = size
+        self.k = k
+        self.nested = nested
+        self.sub_boards_to_win = sub_boards_to_win
+        self.meta_line = meta_line
+        self.stop_at_win = stop_at_win or nested
+        self.squares = size * size
+        self.sub_boards = self.squares if nested else 1
+        self.full = (1 << self.squares) - 1
+        self.all_sub_boards = (1 << self.sub_boards) - 1
+        self.lines, self.lines_through = line_tables(size, k)
+        if nested:
+            self.all_moves = [(b, s) for b in range(self.sub_boards)
+                              for s in range(self.squares)]
+        else:
+            self.all_moves = list(range(self.squares))
+
+
+class NestedGame(GameState):
+    """ A state of a game described by Rules.
+
+    Moves are squares (0 to size * size - 1, row by row) in a flat game and
+    (sub_board, square) tuples in a nested one.
+
+    Attributes:
+        rules (Rules): The game.
+        marks (List[List[int]]): marks[player][sub_board] is the bit mask of
+            the squares of a board marked by player (1 or 2).
+        closed (int): Bit mask of the boards that are won or full.
+        won (List[int]): won[player] is the bit mask of boards player won.
+        sub_boards_won (List[int]): Number of boards won by each player.
+        winner (int): The player who has won the game, 0 if none.
+        squares_played (int): Number of squares marked.
+        last_square_played (int): Square of the last move; in a nested game,
+            the sub board the next player is sent to.
+        history (List[Tuple[int, int]]): (last_square_played, winner) before
+            each move, for undo_move().
+    """
+
+    def __init__(self, rules: Rules = None):
+        super().__init__()
+        self.rules = rules if rules is not None else SUPER_TIC_TAC_TOE
+        boards = self.rules.sub_boards
+        self.marks = [None, [0] * boards, [0] * boards]
+        self.closed = 0
+        self.won = [0, 0, 0]
+        self.sub_boards_won = [0, 0, 0]
+        self.winner = 0
+        self.squares_played = 0
+        self.last_square_played = 0
+        self.history = []
+
+    def clone(self) -> 'NestedGame':
+        """ Create a deep clone of this game state. """
+        state = NestedGame(self.rules)
+        state.player_just_moved = self.player_just_moved
+        state.marks = [None, self.marks[1][:], self.marks[2][:]]
+        state.closed = self.closed
+        state.won = self.won[:]
+        state.sub_boards_won = self.sub_boards_won[:]
+        state.winner = self.winner
+        state.squares_played = self.squares_played
+        state.last_square_played = self.last_square_played
+        state.history = self.history[:]
+        return state
+
+    def do_move(self, move):
+        """ Update state by marking the square of move. """
+        rules = self.rules
+        if rules.nested:
+            sub_board, square = move
+        else:
+            sub_board, square = 0, move
+        bit = 1 << square
+        marks = self.marks
+        assert not (marks[1][sub_board] | marks[2][sub_board]) & bit
+
+        player = 3 - self.player_just_moved
+        self.player_just_moved = player
+        self.history.append((self.last_square_played, self.winner))
+        self.last_square_played = square
+        self.squares_played += 1
+        mine = marks[player][sub_board] | bit
+        marks[player][sub_board] = mine
+
+        won = False
+        if rules.stop_at_win:
+            for line in rules.lines_through[square]:
+                if mine & line == line:
+                    won = True
+                    break
+        if won:
+            self.closed |= 1 << sub_board
+            if not rules.nested:
+                self.winner = player
+                return
+            self.won[player] |= 1 << sub_board
+            self.sub_boards_won[player] += 1
+            if rules.meta_line:
+                boards = self.won[player]
+                for line in rules.lines_through[sub_board]:
+                    if boards & line == line:
+                        self.winner = player
+                        break
+            elif self.sub_boards_won[player] == rules.sub_boards_to_win:
+                self.winner = player
+        elif marks[1][sub_board] | marks[2][sub_board] == rules.full:
+            self.closed |= 1 << sub_board
+
+    def undo_move(self, move):
+        """ Take back the given move, which must be the last move done. """
+        if self.rules.nested:
+            sub_board, square = move
+        else:
+            sub_board, square = 0, move
+        player = self.player_just_moved
+        assert (self.marks[player][sub_board] >> square) & 1
+        if (self.closed >> sub_board) & 1:
+            # The board was open before the move.
+            self.closed &= ~(1 << sub_board)
+            if (self.won[player] >> sub_board) & 1:
+                self.won[player] &= ~(1 << sub_board)
+                self.sub_boards_won[player] -= 1
+        self.marks[player][sub_board] &= ~(1 << square)
+        self.last_square_played, self.winner = self.history.pop()
+        self.squares_played -= 1
+        self.player_just_moved = 3 - player
+
+    def free_squares(self, sub_board: int) -> List[int]:
+        """ The empty squares of a board, in ascending order. """
+        taken = self.marks[1][sub_board] | self.marks[2][sub_board]
+        return [i for i in range(self.rules.squares) if not (taken >> i) & 1]
+
+    def has_moves(self) -> bool:
+        """ Check if there is any legal move, without building the list. """
+        return self.winner == 0 and self.closed != self.rules.all_sub_boards
+
+    def empty_squares(self) -> int:
+        """ Get the number of empty squares in the open boards. """
+        rules = self.rules
+        count = 0
+        for sub_board in range(rules.sub_boards):
+            if not (self.closed >> sub_board) & 1:
+                taken = self.marks[1][sub_board] | self.marks[2][sub_board]
+                count += rules.squares - taken.bit_count()
+        return count
+
+    def get_moves(self) -> List:
+        """ Get all possible moves from this state, in the order of the
+        boards and then of the squares.
+        """
+        rules = self.rules
+        if not self.has_moves():
+            return []
+        if not rules.nested:
+            return self.free_squares(0)
+        if self.squares_played == 0:
+            return rules.all_moves[:]
+        sub_board = self.last_square_played
+        if not (self.closed >> sub_board) & 1:
+            return [(sub_board, i) for i in self.free_squares(sub_board)]
+        moves = []
+        for sub_board in range(rules.sub_boards):
+            if not (self.closed >> sub_board) & 1:
+                moves += [(sub_board, i) for i in self.free_squares(sub_board)]
+        return moves
+
+    def get_result(self, player: int) -> float:
+        """Get the game result from the viewpoint of player.
+
+        Args:
+            player: 1 or 2
+
+        Returns:
+            1.0 if player wins, 0.0 if player loses, 0.5 for a draw.
+        """
+        winner = self.winner
+        if not self.rules.stop_at_win:
+            for line in self.rules.lines:
+                if self.marks[1][0] & line == line:
+                    winner = 1
+                    break
+                if self.marks[2][0] & line == line:
+                    winner = 2
+                    break
+        if winner == 0:
+            return 0.5
+        return 1.0 if winner == player else 0.0
+
+    def __repr__(self):
+        """ Return a string representation of the board(s). """
+        rules = self.rules
+        size = rules.size
+
+        def mark(sub_board: int, square: int) -> str:
+            if (self.marks[1][sub_board] >> square) & 1:
+                return 'X'
+            if (self.marks[2][sub_board] >> square) & 1:
+                return 'O'
+            return '.'
+
+        if not rules.nested:
+            s = ""
+            for row in range(size):
+                s += "".join(mark(0, size * row + c) for c in range(size))
+                s += "\n"
+            return s
+        s = ""
+        for band in range(size):
+            for row in range(size):
+                for sub_board in range(size * band, size * band + size):
+                    s += "".join(mark(sub_board, size * row + c)
+                                 for c in range(size)) + ' '
+                s += '\n'
+            s += '\n'
+        s += '\n'
+        return s
+
+
+# Registry of games by name.
+GAMES = {}  # type: Dict[str, Rules]
+
+
+def register(name: str, rules: Rules) -> Rules:
+    """ Add a game to GAMES, and return its rules. """
+    GAMES[name] = rules
+    return rules
+
+
+def new_game(name: str) -> NestedGame:
+    """ Start a game from the registry. """
+    return NestedGame(GAMES[name])
+
+
+TIC_TAC_TOE = register('tictactoe', Rules(3, 3, stop_at_win=False))
+SUPER_TIC_TAC_TOE = register('super_tictactoe',
+                             Rules(3, 3, nested=True, sub_boards_to_win=3))
+register('ultimate_tictactoe', Rules(3, 3, nested=True, meta_line=True))
+register('four_in_a_row', Rules(6, 4))
+register('gomoku', Rules(15, 5))
+register('super_4x4', Rules(4, 3, nested=True, sub_boards_to_win=5))
@@ -0,0 +1,175 @@
+"""
+Opening book: precomputed moves for the first few plies of a game.
+
+The first moves of every game are searched from scratch, although they are
+always the same positions. An opening book stores the move chosen by a deep
+search for every position up to a given number of plies, keyed by the
+canonical form of the position (see symmetry.py), so the 8 symmetric
+versions of a position share one entry.
+
+The book is built offline (run this module) and stored in a compact binary
+file:
+
+    header   magic b'MCTB', version (uint16), squares on the board (uint16),
+             number of entries n (uint32), little endian
+    keys     n uint64 canonical keys, in ascending order
+    moves    n uint8 moves in the canonical frame (the square, or
+             9 * sub_board + square for SuperTicTacToe)
+
+OpeningBook memory-maps the file and binary searches the keys in place, so
+opening a book costs nothing whatever its size. Pass it to play.search or
+play.play_game as book= and the book move is played when there is one.
+
+Usage:
+    python opening_book.py --game SuperTicTacToe --plies 2 \\
+        --iterations 10000 --output opening_book.bin
+"""
+import argparse
+import bisect
+import mmap
+import multiprocessing
+import random
+import struct
+import sys
+from array import array
+from typing import Dict
+
+import game_state
+import play
+from game_state import GameState, move_to_index, index_to_move
+from symmetry import canonical_key, transform_move, INVERSES
+
+MAGIC = b'MCTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+
+
+class OpeningBook:
+    """ A memory-mapped opening book file.
+
+    Attributes:
+        squares (int): Squares on the board, 9 or 81.
+    """
+
+    def __init__(self, path: str):
+        """Open and memory-map a book written by write_book()."""
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.squares, n = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not an opening book')
+        start = HEADER.size
+        view = memoryview(self.map)
+        self.keys = view[start:start + 8 * n].cast('Q')
+        self.moves = view[start + 8 * n:start + 9 * n]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, state: GameState):
+        """ Return the book move for state, or None if it is not in the book.
+        """
+        key, t = canonical_key(state)
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        move = index_to_move(self.moves[i], self.squares)
+        return transform_move(move, INVERSES[t])
+
+    def close(self):
+        """ Unmap the file. """
+        self.keys.release()
+        self.moves.release()
+        self.map.close()
+
+
+def write_book(path: str, entries: Dict[int, int], squares: int):
+    """ Write a book file.
+
+    Args:
+        path: File to write.
+        entries: Canonical key to encoded canonical move.
+        squares: Squares on the board, 9 or 81.
+    """
+    keys = sorted(entries)
+    if sys.byteorder != 'little':
+        raise ValueError('opening books are little endian')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, squares, len(keys)))
+        f.write(array('Q', keys).tobytes())
+        f.write(bytes(entries[k] for k in keys))
+
+
+def _book_move(task) -> 'Move':
+    """ Worker: search a position for the book. """
+    state, itermax, seed = task
+    random.seed(seed)
+    return play.search(state, itermax)
+
+
+def build_book(game: type, plies: int, itermax: int, workers: int = None,
+               seed: int = 0, verbose=False) -> Dict[int, int]:
+    """ Search every position of the first plies plies of a game.
+
+    Positions are reduced by symmetry before searching.
+
+    Args:
+        game: The GameState class.
+        plies: Positions with fewer than this many moves played get a move.
+        itermax: Search iterations per position.
+        workers: Worker processes to search with, default one per core.
+        seed: Random seed.
+        verbose: True => print progress.
+
+    Returns:
+        Canonical key to encoded canonical move, for write_book().
+    """
+    rng = random.Random(seed)
+    entries = {}
+    frontier = {canonical_key(game())[0]: game()}
+    with multiprocessing.Pool(processes=workers) as pool:
+        for ply in range(plies):
+            keys = list(frontier)
+            states = [frontier[k] for k in keys]
+            tasks = [(s, itermax, rng.getrandbits(32)) for s in states]
+            moves = pool.map(_book_move, tasks)
+            next_frontier = {}
+            for key, state, move in zip(keys, states, moves):
+                t = canonical_key(state)[1]
+                entries[key] = move_to_index(transform_move(move, t))
+                if ply + 1 < plies:
+                    for m in state.get_moves():
+                        child = state.clone()
+                        child.do_move(m)
+                        if not child.is_terminal():
+                            next_frontier.setdefault(canonical_key(child)[0],
+                                                     child)
+            if verbose:
+                print('Ply', ply, 'positions', len(states))
+            frontier = next_frontier
+    return entries
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--game', default='SuperTicTacToe',
+                        help='GameState class (default SuperTicTacToe)')
+    parser.add_argument('--plies', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=10000,
+                        help='search iterations per position')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='opening_book.bin')
+    args = parser.parse_args(argv)
+
+    game = getattr(game_state, args.game)
+    entries = build_book(game, args.plies, args.iterations, args.workers,
+                         args.seed, verbose=True)
+    squares = 9 if issubclass(game, game_state.TicTacToe) else 81
+    write_book(args.output, entries, squares)
+    print('Wrote', len(entries), 'positions to', args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
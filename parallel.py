@@ -0,0 +1,193 @@
+"""
+Parallel Monte Carlo Tree Search over a pool of worker processes.
+
+Two ways of spreading the work of play.search over several cores:
+
+    root parallel: Every worker grows its own tree from the same root state
+        with its own random seed. The visits and wins of the root's children
+        are summed over all the trees and the most visited move is played.
+
+    leaf parallel: The main process grows a single tree. Each time a node is
+        expanded, every worker runs a batch of random rollouts from it and the
+        results are backpropagated together.
+
+In root mode the workers can start from a tree saved by checkpoint.save()
+instead of an empty root; each opens the file and loads the part of the tree
+it needs.
+
+The worker pool is created once by ParallelSearch and reused for every move,
+so a game played with play_game(..., searcher=ParallelSearch(...)) does not
+pay the cost of starting processes on every turn.
+"""
+import multiprocessing
+import random
+from typing import Dict, Tuple
+
+from checkpoint import Checkpoint, root_key
+from game_state import GameState
+from play import Node, iterate, select, expand
+
+
+def _root_children(rootnode: Node) -> Dict['Move', Tuple[int, float]]:
+    """ The (visits, wins) of the children of rootnode. """
+    return {c.move: (c.visits, c.wins) for c in rootnode.child_nodes}
+
+
+def _grow_tree(task) -> Dict['Move', Tuple[int, float]]:
+    """ Worker: grow a tree and return the (visits, wins) of root children,
+    not counting those of the checkpoint the tree was started from.
+    """
+    rootstate, itermax, seed, checkpoint = task
+    random.seed(seed)
+    if checkpoint is None:
+        rootnode = Node(state=rootstate)
+        iterate(rootnode, rootstate, itermax)
+        return _root_children(rootnode)
+    with Checkpoint(checkpoint) as saved:
+        rootnode = saved.root(rootstate)
+        before = _root_children(rootnode)
+        iterate(rootnode, rootstate, itermax)
+        after = _root_children(rootnode)
+    for m, (visits, wins) in before.items():
+        after[m] = (after[m][0] - visits, after[m][1] - wins)
+    return after
+
+
+def _rollouts(task) -> float:
+    """ Worker: run rollouts from a state.
+
+    Returns:
+        The total of the results from the viewpoint of player 1.
+    """
+    state, rollouts, seed = task
+    rng = random.Random(seed)
+    total = 0.0
+    for i in range(rollouts):
+        s = state.clone()
+        s.do_random_rollout(rng)
+        total += s.get_result(1)
+    return total
+
+
+class ParallelSearch:
+    """ A UCT search that runs on a persistent pool of worker processes.
+
+    Call it like play.search, or pass it to play.play_game as the searcher.
+    Close it (or use it as a context manager) to shut the pool down.
+
+    Attributes:
+        mode (str): 'root' or 'leaf'.
+        workers (int): Number of worker processes.
+        rollouts_per_worker (int): In leaf mode, the rollouts each worker runs
+            for every expanded node.
+        checkpoint (str): In root mode, a checkpoint file the workers start
+            from when searching the position it was saved from, or None.
+    """
+
+    def __init__(self, mode: str = 'root', workers: int = None,
+                 rollouts_per_worker: int = 1, checkpoint: str = None):
+        """Start the worker pool.
+
+        Args:
+            mode: 'root' for root parallel search, 'leaf' for leaf parallel.
+            workers: Number of worker processes, default one per core.
+            rollouts_per_worker: Rollouts per worker per leaf (leaf mode).
+            checkpoint: Checkpoint file to start root mode searches from.
+        """
+        assert mode in ('root', 'leaf')
+        self.mode = mode
+        self.workers = workers or multiprocessing.cpu_count()
+        self.rollouts_per_worker = rollouts_per_worker
+        self.checkpoint = checkpoint
+        self.pool = multiprocessing.Pool(processes=self.workers)
+
+    def __call__(self, rootstate: GameState, itermax: int) -> 'Move':
+        return self.search(rootstate, itermax)
+
+    def search(self, rootstate: GameState, itermax: int) -> 'Move':
+        """ Do a parallel UCT search.
+
+        Args:
+            rootstate: Starting state.
+            itermax: Iterations to search. In root mode each worker grows a
+                tree of itermax iterations; in leaf mode the single tree gets
+                itermax iterations, each with a batch of rollouts.
+
+        Returns:
+            The move that was most visited.
+        """
+        if self.mode == 'root':
+            stats = self.root_statistics(rootstate, itermax)
+            # Ties go to the last move, as in play.best_move.
+            return sorted(stats, key=lambda m: stats[m][0])[-1]
+        else:
+            rootnode = self.leaf_tree(rootstate, itermax)
+            return sorted(rootnode.child_nodes, key=lambda c: c.visits)[-1].move
+
+    def root_statistics(self, rootstate: GameState,
+                        itermax: int) -> Dict['Move', Tuple[int, float]]:
+        """ Grow one tree per worker and merge their root children.
+
+        If the checkpoint was saved from rootstate, every tree starts from it
+        and its statistics are counted once.
+
+        Returns:
+            A dict mapping each root move to its total (visits, wins) over all
+            the trees, in the order of rootstate.get_moves().
+        """
+        stats = {m: (0, 0.0) for m in rootstate.get_moves()}
+        checkpoint = None
+        if self.checkpoint is not None:
+            with Checkpoint(self.checkpoint) as saved:
+                if saved.key == root_key(rootstate):
+                    checkpoint = self.checkpoint
+                    stats.update(_root_children(saved.root(rootstate)))
+        tasks = [(rootstate, itermax, random.getrandbits(32), checkpoint)
+                 for i in range(self.workers)]
+        for children in self.pool.map(_grow_tree, tasks):
+            for m, (visits, wins) in children.items():
+                total_visits, total_wins = stats[m]
+                stats[m] = (total_visits + visits, total_wins + wins)
+        return {m: stats[m] for m in stats if stats[m][0] > 0}
+
+    def leaf_tree(self, rootstate: GameState, itermax: int) -> Node:
+        """ Grow a single tree, running the rollouts on the workers.
+
+        Returns:
+            The root of the tree.
+        """
+        rootnode = Node(state=rootstate)
+        batch = self.workers * self.rollouts_per_worker
+        for i in range(itermax):
+            state = rootstate.clone()
+            node = select(rootnode, state)
+            node = expand(node, state)
+
+            if state.is_terminal():
+                # Terminal, no need to ask the workers.
+                total = batch * state.get_result(1)
+            else:
+                tasks = [(state, self.rollouts_per_worker,
+                          random.getrandbits(32))
+                         for j in range(self.workers)]
+                total = sum(self.pool.map(_rollouts, tasks))
+
+            # Backpropagate the whole batch.
+            while node != None:
+                if node.player_just_moved == 1:
+                    node.update(total, batch)
+                else:
+                    node.update(batch - total, batch)
+                node = node.parent_node
+        return rootnode
+
+    def close(self):
+        """ Shut down the worker pool. """
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
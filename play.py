@@ -26,6 +26,8 @@ www.mcts.ai
 """
 import math
 import random
+import threading
+import time
 from game_state import GameState
 
 
@@ -73,13 +75,15 @@ class Node:
         self.child_nodes.append(n)
         return n
 
-    def update(self, result):
+    def update(self, result, visits=1):
         """ Update this node.
         
         One additional visit and result additional wins. 
-        Result must be from the viewpoint of player_just_moved.
+        Result must be from the viewpoint of player_just_moved. When a batch
+        of rollouts is applied at once, visits is the size of the batch and
+        result the total of their results.
         """
-        self.visits += 1
+        self.visits += visits
         self.wins += result
 
     def __repr__(self):
@@ -106,7 +110,8 @@ class Node:
         return s
 
 
-def search(rootstate: GameState, itermax: int, verbose=False) -> 'Move':
+def search(rootstate: GameState, itermax: int, verbose=False,
+           profiler=None, book=None, in_place=False, policy=None) -> 'Move':
     """ Do a UCT search.
 
     Assumes 2 alternating players (player 1 starts), with game results in the 
@@ -116,74 +121,348 @@ def search(rootstate: GameState, itermax: int, verbose=False) -> 'Move':
         rootstate: Starting state. 
         itermax: Iterations to search.
         verbose: True => print stuff out.
+        profiler: A profiling.SearchProfiler to record the search, or None.
+        book: An opening_book.OpeningBook to look rootstate up in first, or
+            None.
+        in_place: True => walk one copy of rootstate down and back up the
+            tree with undo_move() instead of cloning it every iteration.
+            Only for random rollouts (no policy), and not with a profiler.
+        policy: A rollout_policy.RolloutPolicy to play and score rollouts
+            with, or None for uniformly random rollouts.
 
     Returns:
-        The move that was most visited.
+        The book move, or else the move that was most visited.
     """
+    if book is not None:
+        m = book.lookup(rootstate)
+        if m is not None:
+            return m
+    if in_place and policy is not None:
+        raise ValueError('in_place search needs random rollouts')
+    if in_place and profiler is not None:
+        raise ValueError('in_place search cannot be profiled')
     rootnode = Node(state=rootstate)
+    if profiler is not None:
+        profiler.iterate(rootnode, rootstate, itermax, policy)
+    elif in_place:
+        iterate_in_place(rootnode, rootstate.clone(), itermax)
+    else:
+        iterate(rootnode, rootstate, itermax, policy)
+    return best_move(rootnode)
+
+
+def iterate(rootnode: Node, rootstate: GameState, itermax: int,
+            policy=None):
+    """ Grow a UCT search tree.
 
+    Args:
+        rootnode: Root of the tree, created from rootstate.
+        rootstate: The state at rootnode (not modified).
+        itermax: Iterations to search.
+        policy: A rollout_policy.RolloutPolicy, or None for uniformly random
+            rollouts.
+    """
     for i in range(itermax):
-        node = rootnode
         state = rootstate.clone()
+        node = select(rootnode, state)
+        node = expand(node, state)
+        if policy is None:
+            state.do_random_rollout(random)
+            backpropagate(node, state)
+        else:
+            backpropagate_result(node, policy(state, random))
+
+
+def iterate_in_place(rootnode: Node, state: GameState, itermax: int):
+    """ Grow a UCT search tree without copying the state.
 
-        # Select
-        while node.untried_moves == [] and node.child_nodes != []:
-            # node is fully expanded and non-terminal
-            node = node.select_child()
-            state.do_move(node.move)
+    Does the same iterations as iterate(), but each one does its moves on
+    state and then takes them back with undo_move(), rollout included, so
+    nothing is cloned.
 
-        # Expand
-        if node.untried_moves != []:  
-            # We can expand (i.e. state/node is non-terminal)
-            m = random.choice(node.untried_moves)
+    Args:
+        rootnode: Root of the tree, created from state.
+        state: The state at rootnode; restored before returning.
+        itermax: Iterations to search.
+    """
+    for i in range(itermax):
+        node = select(rootnode, state)
+        node = expand(node, state)
+
+        # Rollout
+        rollout = []
+        m = state.get_random_move(random)
+        while m is not None:
             state.do_move(m)
-            # add child and descend tree
-            node = node.add_child(m, state)
-
-        # Rollout - this can often be made orders of magnitude quicker 
-        # using a state.GetRandomMove() function
-        while state.get_moves() != []:  # while state is non-terminal
-            state.do_move(random.choice(state.get_moves()))
-
-        # Backpropagate from the expanded node and work back to the root.
-        while node != None:
-            # state is terminal. Update node with result from POV of 
-            # node.player_just_moved
-            node.update(state.get_result(node.player_just_moved))
+            rollout.append(m)
+            m = state.get_random_move(random)
+        result = {1: state.get_result(1), 2: state.get_result(2)}
+        for m in reversed(rollout):
+            state.undo_move(m)
+
+        # Backpropagate, taking back the moves of the path.
+        while node is not rootnode:
+            node.update(result[node.player_just_moved])
+            state.undo_move(node.move)
             node = node.parent_node
+        node.update(result[node.player_just_moved])
+
+
+def select(rootnode: Node, state: GameState) -> Node:
+    """ Descend from rootnode through fully expanded nodes using UCB1.
+
+    Args:
+        rootnode: Where to start.
+        state: The state at rootnode; updated with the moves descended.
+
+    Returns:
+        The first node that has untried moves or no children.
+    """
+    node = rootnode
+    while node.untried_moves == [] and node.child_nodes != []:
+        # node is fully expanded and non-terminal
+        node = node.select_child()
+        state.do_move(node.move)
+    return node
+
+
+def expand(node: Node, state: GameState) -> Node:
+    """ Add a child for a random untried move of node, if it has one.
+
+    Args:
+        node: The node to expand.
+        state: The state at node; updated with the move expanded.
+
+    Returns:
+        The new child, or node itself if it is terminal.
+    """
+    if node.untried_moves != []:
+        # We can expand (i.e. state/node is non-terminal)
+        m = random.choice(node.untried_moves)
+        state.do_move(m)
+        # add child and descend tree
+        node = node.add_child(m, state)
+    return node
+
+
+def backpropagate(node: Node, state: GameState):
+    """ Update node and its ancestors with the result of a terminal state. """
+    while node != None:
+        # state is terminal. Update node with result from POV of
+        # node.player_just_moved
+        node.update(state.get_result(node.player_just_moved))
+        node = node.parent_node
+
+
+def backpropagate_result(node: Node, result: float):
+    """ Update node and its ancestors with a result for player 1. """
+    while node is not None:
+        if node.player_just_moved == 1:
+            node.update(result)
+        else:
+            node.update(1.0 - result)
+        node = node.parent_node
+
+
+def best_move(rootnode: Node) -> 'Move':
+    """ Return the move of the most visited child of rootnode. """
+    return sorted(rootnode.child_nodes, key=lambda c: c.visits)[-1].move
+
+
+class TreeSearch:
+    """ A UCT search that keeps its tree from one move to the next.
+
+    Call it like search. After every move of the game (by either player),
+    call advance() with the move so that the tree is re-rooted at the
+    matching child; the iterations already spent on that subtree then count
+    toward the next search.
+
+    Attributes:
+        rootnode (Node): Root of the tree kept, or None to start afresh.
+    """
+
+    def __init__(self):
+        self.rootnode = None
+
+    def __call__(self, rootstate: GameState, itermax: int) -> 'Move':
+        """ Add itermax iterations to the tree and return the best move. """
+        if self.rootnode is None:
+            self.rootnode = Node(state=rootstate)
+        iterate(self.rootnode, rootstate, itermax)
+        return best_move(self.rootnode)
+
+    def advance(self, move):
+        """ Re-root the tree at the child reached by move.
+
+        The tree is dropped if that child has not been expanded yet.
+        """
+        if self.rootnode is None:
+            return
+        for c in self.rootnode.child_nodes:
+            if c.move == move:
+                c.parent_node = None
+                self.rootnode = c
+                return
+        self.rootnode = None
+
+
+class AnytimeSearch:
+    """ A UCT search with a time and memory budget that can be stopped early.
+
+    run() searches until a deadline, a node budget or an iteration count is
+    reached, whichever comes first, or until another thread calls stop().
+    best_move() and the counters can be read at any time, including from
+    another thread while run() is in progress.
+
+    Attributes:
+        rootnode (Node): Root of the search tree.
+        iterations (int): Number of iterations completed.
+        nodes (int): Number of nodes in the tree.
+        policy (RolloutPolicy): The rollout policy, None for random rollouts.
+    """
+
+    def __init__(self, rootstate: GameState, policy=None):
+        self.policy = policy
+        self.rootstate = rootstate.clone()
+        self.rootnode = Node(state=rootstate)
+        self.iterations = 0
+        self.nodes = 1
+        self.stopped = threading.Event()
+
+    def run(self, time_limit: float = None, max_nodes: int = None,
+            itermax: int = None) -> 'Move':
+        """ Search until a budget runs out or stop() is called.
+
+        At least one iteration is done (unless already stopped), so there is
+        a move to return from any non-terminal state. Can be called again to
+        continue the search.
+
+        Args:
+            time_limit: Seconds to search for, None for no limit.
+            max_nodes: Stop when the tree has this many nodes.
+            itermax: Stop after this many more iterations.
+
+        Returns:
+            The move that was most visited.
+        """
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        done = 0
+        while not self.stopped.is_set():
+            state = self.rootstate.clone()
+            node = select(self.rootnode, state)
+            child = expand(node, state)
+            if child is not node:
+                self.nodes += 1
+            if self.policy is None:
+                state.do_random_rollout(random)
+                backpropagate(child, state)
+            else:
+                backpropagate_result(child, self.policy(state, random))
+            self.iterations += 1
+
+            done += 1
+            if itermax is not None and done >= itermax:
+                break
+            if max_nodes is not None and self.nodes >= max_nodes:
+                break
+            if time_limit is not None and time.perf_counter() >= deadline:
+                break
+        return self.best_move()
 
-    # return the move that was most visited
-    return sorted(rootnode.child_nodes, key=lambda c: c.visits)[-1].move  
+    def stop(self):
+        """ Make run() return after the current iteration. Thread safe. """
+        self.stopped.set()
+
+    def best_move(self) -> 'Move':
+        """ Return the most visited move so far, None if there is none. """
+        if self.rootnode.child_nodes == []:
+            return None
+        return best_move(self.rootnode)
 
 
 def play_game(state: GameState, player_1_strength: int, player_2_strength: int,
-              verbose=True):
+              verbose=True, searcher=search, reuse_tree=False,
+              player_1_time: float = None, player_2_time: float = None,
+              book=None, record=None, seed: int = 0):
     """Play a simple game between two UCT players.
 
     Args:
         state: The game being played.
-        player_1_strength: The strength of player 1 (max iterations).
-        player_2_strength: The strength of player 2 (max_iterations).
+        player_1_strength: The strength of player 1 (max iterations). May be
+            None if player_1_time is given.
+        player_2_strength: The strength of player 2 (max_iterations). May be
+            None if player_2_time is given.
         verbose: True => print out status as game progresses.
+        searcher: Called as searcher(rootstate, itermax) to choose each move,
+            e.g. search or a parallel.ParallelSearch.
+        reuse_tree: True => each player keeps its search tree between moves
+            (a TreeSearch), and searcher is not used.
+        player_1_time: Time budget per move for player 1, in seconds. If
+            given, player 1 uses an AnytimeSearch that stops at the time
+            budget or player_1_strength iterations, whichever comes first.
+        player_2_time: Time budget per move for player 2, in seconds.
+        book: An opening_book.OpeningBook. Both players play the book move
+            when there is one, and search otherwise.
+        record: A game_record.GameRecordWriter the game is appended to.
+        seed: The random seed of the game, stored in the record.
 
+    Returns:
+        The winner, 1 or 2, or 0 for a draw.
     """
+    if reuse_tree:
+        trees = [TreeSearch(), TreeSearch()]
+        searchers = trees[:]
+    else:
+        trees = []
+        searchers = [searcher, searcher]
+    for i, time_limit in enumerate([player_1_time, player_2_time]):
+        if time_limit is not None:
+            searchers[i] = _timed_searcher(time_limit)
     move = 1
-    while (state.get_moves() != []):
-        if state.player_just_moved == 1:
+    moves = []
+    while not state.is_terminal():
+        m = None
+        if book is not None:
+            m = book.lookup(state)
+        if m is not None:
+            pass
+        elif state.player_just_moved == 1:
             # Player 2
-            m = search(rootstate=state, itermax=player_2_strength)
+            m = searchers[1](state, player_2_strength)
         else:
             # Player 1
-            m = search(rootstate=state, itermax=player_1_strength)
+            m = searchers[0](state, player_1_strength)
         state.do_move(m)
+        moves.append(m)
+        for tree in trees:
+            tree.advance(m)
         if verbose:
             print("Move", move, 'player', state.player_just_moved)
         move += 1
         if verbose:
             print(str(state))
     if state.get_result(state.player_just_moved) == 1.0:
-        print("Player " + str(state.player_just_moved) + " wins!")
+        winner = state.player_just_moved
     elif state.get_result(state.player_just_moved) == 0.0:
-        print("Player " + str(3 - state.player_just_moved) + " wins!")
+        winner = 3 - state.player_just_moved
+    else:
+        winner = 0
+    if record is not None:
+        record.write(moves, winner, (player_1_strength, player_2_strength),
+                     seed)
+    if winner:
+        print("Player " + str(winner) + " wins!")
     else:
         print("Nobody wins!")
+    return winner
+
+
+def _timed_searcher(time_limit: float):
+    """ Return a searcher(rootstate, itermax) with a time budget per move. """
+
+    def searcher(rootstate: GameState, itermax: int) -> 'Move':
+        return AnytimeSearch(rootstate).run(time_limit=time_limit,
+                                            itermax=itermax)
+
+    return searcher
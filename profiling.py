@@ -0,0 +1,176 @@
+"""
+Opt-in instrumentation of play.search.
+
+Pass a SearchProfiler to play.search to find out where the time of a search
+goes:
+
+    profiler = SearchProfiler()
+    move = play.search(state, 1000, profiler=profiler)
+    print(profiler.report())
+
+The profiler runs the same iterations as play.iterate (so the same move is
+chosen), timing the select, expand, rollout and backpropagate phases. It
+also counts the GameState calls made (clone, do_move, get_moves,
+wins_sub_board, ...) and records how deep the selections went and the shape
+of the tree. With no profiler, play.search takes its usual path and nothing
+is measured, so there is no overhead.
+"""
+import random
+import time
+from typing import Callable, Dict
+
+from game_state import GameState
+from play import Node, select, expand, backpropagate, backpropagate_result
+
+PHASES = ('select', 'expand', 'rollout', 'backpropagate')
+
+# GameState methods that are counted, if the game has them.
+COUNTED_METHODS = ('clone', 'do_move', 'get_moves', 'get_result',
+                   'get_random_move', 'do_random_rollout', 'wins_sub_board',
+                   'sub_board_is_available')
+
+
+class SearchProfiler:
+    """ Collects timings and counts from the searches it is passed to.
+
+    Counts accumulate over searches until reset(); the tree statistics are
+    for the last search.
+
+    Attributes:
+        on_iteration (Callable[[Dict], None]): If not None, called after every
+            iteration with a dict of the seconds spent in each phase and the
+            'depth' of the selection.
+        iterations (int): Iterations profiled.
+        phase_seconds (Dict[str, float]): Total seconds per phase.
+        state_calls (Dict[str, int]): Number of calls per GameState method.
+        max_depth (int): Deepest selection.
+        total_depth (int): Sum of the selection depths.
+        rootnode (Node): Root of the last search tree.
+    """
+
+    def __init__(self, on_iteration: Callable[[Dict], None] = None):
+        self.on_iteration = on_iteration
+        self.reset()
+
+    def reset(self):
+        """ Clear all the statistics. """
+        self.iterations = 0
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.state_calls = {}
+        self.max_depth = 0
+        self.total_depth = 0
+        self.rootnode = None
+        # Counting classes refer to state_calls, so are made afresh.
+        self.counting_classes = {}
+
+    def counting_class(self, cls: type) -> type:
+        """ Return a subclass of cls that counts calls in state_calls. """
+        if cls in self.counting_classes:
+            return self.counting_classes[cls]
+
+        calls = self.state_calls
+        profiler = self
+
+        def counter(name, method):
+            def counted(state, *args, **kwargs):
+                calls[name] = calls.get(name, 0) + 1
+                result = method(state, *args, **kwargs)
+                if name == 'clone':
+                    result.__class__ = profiler.counting_class(cls)
+                return result
+            return counted
+
+        methods = {name: counter(name, getattr(cls, name))
+                   for name in COUNTED_METHODS if hasattr(cls, name)}
+        counting = type('Counting' + cls.__name__, (cls,), methods)
+        self.counting_classes[cls] = counting
+        return counting
+
+    def iterate(self, rootnode: Node, rootstate: GameState, itermax: int,
+                policy=None):
+        """ play.iterate, with profiling. The rollout phase includes the
+        scoring of a cut off rollout by policy.
+        """
+        self.rootnode = rootnode
+        root = rootstate.clone()
+        root.__class__ = self.counting_class(type(rootstate))
+        seconds = self.phase_seconds
+        clock = time.perf_counter
+
+        for i in range(itermax):
+            t0 = clock()
+            state = root.clone()
+            node = select(rootnode, state)
+            t1 = clock()
+            node = expand(node, state)
+            t2 = clock()
+            if policy is None:
+                state.do_random_rollout(random)
+            else:
+                result = policy(state, random)
+            t3 = clock()
+            depth = 0
+            n = node
+            while n.parent_node is not None:
+                depth += 1
+                n = n.parent_node
+            t4 = clock()
+            if policy is None:
+                backpropagate(node, state)
+            else:
+                backpropagate_result(node, result)
+            t5 = clock()
+
+            seconds['select'] += t1 - t0
+            seconds['expand'] += t2 - t1
+            seconds['rollout'] += t3 - t2
+            seconds['backpropagate'] += t5 - t4
+            self.iterations += 1
+            self.total_depth += depth
+            self.max_depth = max(self.max_depth, depth)
+            if self.on_iteration is not None:
+                self.on_iteration({'select': t1 - t0, 'expand': t2 - t1,
+                                   'rollout': t3 - t2,
+                                   'backpropagate': t5 - t4, 'depth': depth})
+
+    def tree_statistics(self) -> Dict:
+        """ Size, depth and branching of the last search tree. """
+        if self.rootnode is None:
+            return {}
+        nodes = 0
+        internal = 0
+        children = 0
+        max_depth = 0
+        stack = [(self.rootnode, 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes += 1
+            max_depth = max(max_depth, depth)
+            if node.child_nodes:
+                internal += 1
+                children += len(node.child_nodes)
+                stack.extend((c, depth + 1) for c in node.child_nodes)
+        return {'nodes': nodes, 'max_depth': max_depth,
+                'internal_nodes': internal,
+                'mean_branching': children / internal if internal else 0.0,
+                'root_children': len(self.rootnode.child_nodes)}
+
+    def report(self) -> Dict:
+        """ Return all the statistics as a dict. """
+        total = sum(self.phase_seconds.values())
+        phases = {}
+        for phase in PHASES:
+            s = self.phase_seconds[phase]
+            phases[phase] = {'calls': self.iterations, 'seconds': s,
+                             'fraction': s / total if total else 0.0}
+        return {
+            'iterations': self.iterations,
+            'seconds': total,
+            'phases': phases,
+            'state_calls': dict(self.state_calls),
+            'select_depth': {
+                'max': self.max_depth,
+                'mean': (self.total_depth / self.iterations
+                         if self.iterations else 0.0)},
+            'tree': self.tree_statistics(),
+        }
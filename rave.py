@@ -0,0 +1,157 @@
+"""
+UCT search with RAVE (Rapid Action Value Estimation).
+
+A plain UCT node learns about a move only from the iterations that play it
+first, so after a few hundred iterations most moves have been tried once or
+twice. RAVE also keeps all-moves-as-first (AMAF) statistics: after each
+iteration, every child of a node on the path whose move was played later in
+the iteration (further down the path or in the rollout) by the same player
+is updated as if it had been played first. In SuperTicTacToe a move is a
+square, and each square can be marked only once per game, so the AMAF
+statistics of a square gather quickly.
+
+Selection blends the two with the hand-tuned schedule of Gelly and Silver:
+a child visited n times is valued at
+
+    (1 - beta) * wins / visits + beta * amaf_wins / amaf_visits + UCB1 term
+
+where beta = sqrt(k / (3 * n + k)), so the AMAF value dominates while the
+child has few visits and fades out after about k. k is one value for the
+whole search, passed down by iterate(), so it is not stored in the nodes.
+Subclass RaveNode and override beta() to try other schedules.
+
+The AMAF statistics are kept in each child node, next to its own
+statistics, so a node grows by two fields (amaf_visits and amaf_wins)
+rather than by a table of statistics for every move.
+"""
+import math
+import random
+
+from game_state import GameState
+from play import Node, expand, best_move
+
+# Default equivalence parameter k of the schedule.
+DEFAULT_K = 250
+
+
+class RaveNode(Node):
+    """ A node in a UCT tree with AMAF statistics.
+
+    Attributes:
+        amaf_visits (int): Iterations in which this node's move was played
+            by player_just_moved at or below its parent.
+        amaf_wins (float): Their total result, from the viewpoint of
+            player_just_moved.
+    """
+
+    def __init__(self, move=None, parent: 'RaveNode'=None,
+                 state: GameState=None):
+        super().__init__(move=move, parent=parent, state=state)
+        self.amaf_visits = 0
+        self.amaf_wins = 0.0
+
+    def beta(self, child: 'RaveNode', k: float = DEFAULT_K) -> float:
+        """ The weight of the AMAF value of child, between 0 and 1, for the
+        equivalence parameter k.
+        """
+        return math.sqrt(k / (3 * child.visits + k))
+
+    def select_child(self, k: float = DEFAULT_K) -> 'RaveNode':
+        """ Select a child by the blend of its own and AMAF values, plus the
+        UCB1 exploration term.
+
+        Args:
+            k: Equivalence parameter of the schedule.
+        """
+        log_visits = math.log(self.visits)
+
+        def value(c: RaveNode) -> float:
+            q = c.wins / c.visits
+            if c.amaf_visits:
+                beta = self.beta(c, k)
+                q = (1 - beta) * q + beta * c.amaf_wins / c.amaf_visits
+            return q + math.sqrt(2 * log_visits / c.visits)
+
+        return sorted(self.child_nodes, key=value)[-1]
+
+    def add_child(self, move, s: GameState) -> 'RaveNode':
+        """ Remove m from untried_moves and add a new child node for this move.
+            Return the added child node
+        """
+        n = RaveNode(move=move, parent=self, state=s)
+        self.untried_moves.remove(move)
+        self.child_nodes.append(n)
+        return n
+
+    def update_amaf(self, result: float):
+        """ One more AMAF visit with result, from the viewpoint of
+        player_just_moved.
+        """
+        self.amaf_visits += 1
+        self.amaf_wins += result
+
+    def __repr__(self):
+        s = super().__repr__()
+        return s[:-1] + " A:" + str(self.amaf_wins) + "/" + str(
+            self.amaf_visits) + "]"
+
+
+def iterate(rootnode: RaveNode, rootstate: GameState, itermax: int,
+            k: float = DEFAULT_K):
+    """ Grow a RAVE search tree.
+
+    Args:
+        rootnode: Root of the tree, created from rootstate.
+        rootstate: The state at rootnode (not modified).
+        itermax: Iterations to search.
+        k: Equivalence parameter of the schedule.
+    """
+    for i in range(itermax):
+        state = rootstate.clone()
+        # Select, as play.select but passing k down.
+        node = rootnode
+        while node.untried_moves == [] and node.child_nodes != []:
+            node = node.select_child(k)
+            state.do_move(node.move)
+        node = expand(node, state)
+
+        # Rollout, noting the moves played by each player.
+        played = [None, set(), set()]
+        m = state.get_random_move(random)
+        while m is not None:
+            state.do_move(m)
+            played[state.player_just_moved].add(m)
+            m = state.get_random_move(random)
+        result = [None, state.get_result(1), state.get_result(2)]
+
+        # Backpropagate. On the way up, played holds the moves played below
+        # node, so its children that made one of them get an AMAF update.
+        while node is not None:
+            node.update(result[node.player_just_moved])
+            for c in node.child_nodes:
+                if c.move in played[c.player_just_moved]:
+                    c.update_amaf(result[c.player_just_moved])
+            if node.move is not None:
+                played[node.player_just_moved].add(node.move)
+            node = node.parent_node
+
+
+def search(rootstate: GameState, itermax: int, k: float = DEFAULT_K,
+           verbose=False) -> 'Move':
+    """ Do a UCT search with RAVE.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Iterations to search.
+        k: Equivalence parameter of the schedule: roughly the visits after
+            which a child's own statistics count as much as its AMAF ones.
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    rootnode = RaveNode(state=rootstate)
+    iterate(rootnode, rootstate, itermax, k)
+    if verbose:
+        print(rootnode.children_to_string())
+    return best_move(rootnode)
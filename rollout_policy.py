@@ -0,0 +1,346 @@
+"""
+Rollout policies: how the moves of a rollout are chosen, and when it stops.
+
+A rollout policy is called as policy(state, rng) from the leaf of a search;
+it plays moves on state and returns an estimate of get_result(1). Pass one to
+play.search or play.AnytimeSearch as policy= (the default, None, is the
+uniformly random rollout of state.do_random_rollout()).
+
+RolloutPolicy plays uniformly random moves. HeuristicPolicy knows the rules
+of SuperTicTacToe and can, in order:
+
+    tactics             take a square that wins a sub board, or else one
+                        that stops the opponent winning one
+    avoid_free_choice   avoid moves that send the opponent to a closed sub
+                        board, which lets them play anywhere
+    prior               pick among the remaining moves with probability
+                        proportional to a table of 81 weights (DEFAULT_PRIOR,
+                        or one learned from game records by learn_prior())
+
+Either can be given a cutoff: after that many moves the rollout stops and
+the position is scored by evaluate(), from the sub boards won and the sub
+boards each player threatens to win, instead of being played to the end.
+
+Smarter rollouts are slower, so what counts is strength per second of
+search. Running this module plays each policy against random rollouts with
+the same time per move and reports the Elo difference:
+
+    python rollout_policy.py --games 100 --time 0.2
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+from typing import Dict, List
+
+import game_state
+import play
+from game_state import GameState, BitboardSuperTicTacToe, LINE_MASKS
+from game_record import read_games
+from tournament import wilson_interval
+
+# _COMPLETES[mask] is the mask of the squares that complete a line, given
+# the 9 bit mask of a player's marks in a sub board.
+_COMPLETES = [0] * 512
+for _mask in range(512):
+    for _line in LINE_MASKS:
+        _missing = _line & ~_mask
+        if _missing and _missing & (_missing - 1) == 0:
+            _COMPLETES[_mask] |= _missing
+
+# Weights of the squares of a sub board: center, corners, edges.
+_ROLE_WEIGHTS = [2.0, 1.0, 2.0, 1.0, 3.0, 1.0, 2.0, 1.0, 2.0]
+
+# DEFAULT_PRIOR[9 * sub_board + square] is the weight of a move.
+DEFAULT_PRIOR = [_ROLE_WEIGHTS[i % 9] for i in range(81)]
+
+# Value of a sub board won, and of a sub board threatened, for evaluate().
+SUB_BOARD_WEIGHT = 0.15
+THREAT_WEIGHT = 0.04
+
+
+def _marks(state: GameState, player: int, sub_board: int) -> int:
+    """ The 9 bit mask of player's marks in a sub board. """
+    if isinstance(state, BitboardSuperTicTacToe):
+        return (state.marks[player] >> (9 * sub_board)) & 511
+    sub = state.board[sub_board]
+    mask = 0
+    for i in range(9):
+        if sub[i] == player:
+            mask |= 1 << i
+    return mask
+
+
+def _closed(state: GameState) -> int:
+    """ The 9 bit mask of the sub boards that are won or full. """
+    if isinstance(state, BitboardSuperTicTacToe):
+        return state.closed
+    mask = 511
+    for sub_board in state.open_sub_boards:
+        mask ^= 1 << sub_board
+    return mask
+
+
+def _is_super(state: GameState) -> bool:
+    return isinstance(state, (game_state.SuperTicTacToe,
+                              BitboardSuperTicTacToe))
+
+
+def evaluate(state: GameState) -> float:
+    """ A cheap estimate of state.get_result(1).
+
+    Exact if the game is over. Otherwise, for the SuperTicTacToe games,
+    0.5 plus SUB_BOARD_WEIGHT for each sub board player 1 has won more than
+    player 2, plus THREAT_WEIGHT for each open sub board more in which
+    player 1 has a square that completes a line; 0.5 for other games.
+    """
+    if not state.has_moves():
+        return state.get_result(1)
+    if not _is_super(state):
+        return 0.5
+    threats = [0, 0, 0]
+    closed = _closed(state)
+    for sub_board in range(9):
+        if not (closed >> sub_board) & 1:
+            x = _marks(state, 1, sub_board)
+            o = _marks(state, 2, sub_board)
+            free = 511 & ~(x | o)
+            if _COMPLETES[x] & free:
+                threats[1] += 1
+            if _COMPLETES[o] & free:
+                threats[2] += 1
+    won = state.sub_boards_won
+    value = (0.5 + SUB_BOARD_WEIGHT * (won[1] - won[2]) +
+             THREAT_WEIGHT * (threats[1] - threats[2]))
+    return min(max(value, 0.0), 1.0)
+
+
+class RolloutPolicy:
+    """ Uniformly random rollouts, optionally cut off early.
+
+    Subclasses choose moves differently by overriding choose_move().
+
+    Attributes:
+        cutoff (int): Moves after which the rollout is scored with
+            evaluate(), None to play to the end.
+    """
+
+    def __init__(self, cutoff: int = None):
+        self.cutoff = cutoff
+
+    def __call__(self, state: GameState, rng=random) -> float:
+        """ Play a rollout from state (modifying it).
+
+        Returns:
+            The result, or an estimate of it, from the viewpoint of player 1.
+        """
+        if (self.cutoff is None and
+                type(self).choose_move is RolloutPolicy.choose_move):
+            state.do_random_rollout(rng)
+            return state.get_result(1)
+        moves = 0
+        while self.cutoff is None or moves < self.cutoff:
+            m = self.choose_move(state, rng)
+            if m is None:
+                return state.get_result(1)
+            state.do_move(m)
+            moves += 1
+        return evaluate(state)
+
+    def choose_move(self, state: GameState, rng=random) -> 'Move':
+        """ Return the next move of the rollout, None if the game is over. """
+        return state.get_random_move(rng)
+
+
+class HeuristicPolicy(RolloutPolicy):
+    """ SuperTicTacToe rollouts guided by simple rules (see the module
+    docstring). Raises TypeError for other games.
+
+    Attributes:
+        tactics (bool): Win a sub board if possible, else block a win.
+        avoid_free_choice (bool): Avoid giving the opponent a free choice.
+        prior (List[float]): 81 move weights, or None for equal weights.
+    """
+
+    def __init__(self, tactics=True, avoid_free_choice=True,
+                 prior: List[float] = None, cutoff: int = None):
+        super().__init__(cutoff=cutoff)
+        self.tactics = tactics
+        self.avoid_free_choice = avoid_free_choice
+        self.prior = prior
+
+    def choose_move(self, state: GameState, rng=random) -> 'Move':
+        if not _is_super(state):
+            raise TypeError('HeuristicPolicy needs a SuperTicTacToe game, '
+                            'not ' + type(state).__name__)
+        moves = state.get_moves()
+        if moves == []:
+            return None
+        player = 3 - state.player_just_moved
+        wins = {}
+        blocks = {}
+        if self.tactics or self.avoid_free_choice:
+            for sub_board in {m[0] for m in moves}:
+                mine = _marks(state, player, sub_board)
+                theirs = _marks(state, 3 - player, sub_board)
+                free = 511 & ~(mine | theirs)
+                wins[sub_board] = _COMPLETES[mine] & free
+                blocks[sub_board] = _COMPLETES[theirs] & free
+
+        if self.tactics:
+            winning = [m for m in moves if (wins[m[0]] >> m[1]) & 1]
+            if winning:
+                return rng.choice(winning)
+            blocking = [m for m in moves if (blocks[m[0]] >> m[1]) & 1]
+            if blocking:
+                return rng.choice(blocking)
+
+        if self.avoid_free_choice:
+            closed = _closed(state)
+            safe = []
+            for m in moves:
+                sub_board, square = m
+                if (closed >> square) & 1:
+                    continue
+                if square == sub_board and (
+                        (wins[sub_board] >> square) & 1 or
+                        len(_free_squares(state, sub_board)) == 1):
+                    # The move closes the sub board it sends the opponent to.
+                    continue
+                safe.append(m)
+            if safe:
+                moves = safe
+
+        if self.prior is not None:
+            prior = self.prior
+            return rng.choices(moves,
+                               [prior[9 * m[0] + m[1]] for m in moves])[0]
+        return rng.choice(moves)
+
+
+def _free_squares(state: GameState, sub_board: int) -> List[int]:
+    """ The empty squares of a sub board. """
+    if isinstance(state, BitboardSuperTicTacToe):
+        free = state.free_squares(sub_board)
+        return [i for i in range(9) if (free >> i) & 1]
+    return state.free_squares[sub_board]
+
+
+def learn_prior(path: str, smoothing: float = 1.0) -> List[float]:
+    """ Learn a table of move weights from a game_record file.
+
+    The weight of a move (9 * sub_board + square) is the fraction of the
+    times it was played that the player playing it went on to win, with
+    draws counting half, smoothed towards 0.5.
+
+    Args:
+        path: A file written by game_record.GameRecordWriter.
+        smoothing: Pseudo-count of the smoothing.
+    """
+    score = [0.0] * 81
+    played = [0] * 81
+    for game in read_games(path):
+        player = 1
+        for index in game.moves:
+            played[index] += 1
+            if game.winner == player:
+                score[index] += 1.0
+            elif game.winner == 0:
+                score[index] += 0.5
+            player = 3 - player
+    return [(score[i] + 0.5 * smoothing) / (played[i] + smoothing)
+            for i in range(81)]
+
+
+# Policies compared by main().
+POLICIES = {
+    'random': lambda: RolloutPolicy(),
+    'tactics': lambda: HeuristicPolicy(avoid_free_choice=False),
+    'avoid_free_choice': lambda: HeuristicPolicy(tactics=False),
+    'prior': lambda: HeuristicPolicy(tactics=False, avoid_free_choice=False,
+                                     prior=DEFAULT_PRIOR),
+    'heuristic': lambda: HeuristicPolicy(prior=DEFAULT_PRIOR),
+    'cutoff_20': lambda: RolloutPolicy(cutoff=20),
+    'heuristic_cutoff_20': lambda: HeuristicPolicy(prior=DEFAULT_PRIOR,
+                                                   cutoff=20),
+}
+
+
+def elo(score: float) -> float:
+    """ The Elo difference that gives an expected score (0 - 1). """
+    score = min(max(score, 0.001), 0.999)
+    return 400.0 * math.log10(score / (1.0 - score))
+
+
+def play_match(task) -> Dict:
+    """ Play a game between a policy and random rollouts, with the same time
+    per move.
+
+    Args:
+        task: (game class name, policy name, game index, seed, seconds per
+            move). The policy plays first in the even numbered games.
+
+    Returns:
+        The policy's score (1, 0.5 or 0) and iterations per second.
+    """
+    game_name, policy_name, index, seed, time_limit = task
+    random.seed(seed)
+    state = getattr(game_state, game_name)()
+    policies = [POLICIES[policy_name](), None]
+    if index % 2:
+        policies.reverse()
+    policy_player = 1 if index % 2 == 0 else 2
+    iterations = 0
+    moves = 0
+    while not state.is_terminal():
+        policy = policies[2 - state.player_just_moved]
+        search = play.AnytimeSearch(state, policy=policy)
+        m = search.run(time_limit=time_limit)
+        if policy is not None:
+            iterations += search.iterations
+            moves += 1
+        state.do_move(m)
+    return {'score': state.get_result(policy_player),
+            'iters_per_sec': iterations / (moves * time_limit)
+            if moves else 0.0}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--game', default='BitboardSuperTicTacToe')
+    parser.add_argument('--games', type=int, default=20,
+                        help='games per policy')
+    parser.add_argument('--time', type=float, default=0.1,
+                        help='seconds per move')
+    parser.add_argument('--policies', nargs='+',
+                        default=[p for p in POLICIES if p != 'random'],
+                        choices=list(POLICIES))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default one per core)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with multiprocessing.Pool(processes=args.workers) as pool:
+        for name in args.policies:
+            tasks = [(args.game, name, i, args.seed + i, args.time)
+                     for i in range(args.games)]
+            games = pool.map(play_match, tasks)
+            score = sum(g['score'] for g in games)
+            low, high = wilson_interval(score, len(games))
+            print(json.dumps({
+                'policy': name,
+                'games': len(games),
+                'score': score / len(games),
+                'elo': elo(score / len(games)),
+                'elo_ci95': (elo(low), elo(high)),
+                'iters_per_sec': sum(g['iters_per_sec'] for g in games) /
+                len(games),
+                'seconds_per_move': args.time,
+            }), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
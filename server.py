@@ -0,0 +1,341 @@
+"""
+Asyncio game server for many concurrent games.
+
+Clients talk to the server with one JSON object per line, over stdin/stdout
+(the default) or a local TCP or Unix socket. Every request may carry an
+"id", which is copied to its response; requests are handled concurrently,
+so responses can come back in a different order.
+
+Requests ("op"):
+
+    new      {"game": "SuperTicTacToe"} starts a session; returns "session".
+    move     {"session": s, "move": [4, 4]} plays a move.
+    search   {"session": s, "time": 1.0, "iterations": 100000, "play": true}
+             searches for at most "time" seconds (and "iterations"
+             iterations), returns "move" and "iterations" and plays the move
+             if "play" is true. "time" must be a positive number (at most
+             MAX_TIME is used) and "iterations" a positive integer.
+    state    {"session": s} returns the board, legal moves and result.
+    close    {"session": s} ends a session.
+    metrics  returns request counts, queueing and latency statistics.
+
+Searches are CPU bound, so they run on a pool of worker processes and the
+event loop never waits for them: a slow search only delays its own session.
+Requests for one session are handled one at a time, in order.
+
+Usage:
+    python server.py [--port 8765 | --unix /tmp/stt.sock] [--workers 8]
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import game_state
+from game_state import GameState
+from play import AnytimeSearch
+
+# Search time budget when a request gives none, and the most allowed.
+DEFAULT_TIME = 1.0
+MAX_TIME = 60.0
+
+# A search not answered within its time budget plus this many seconds
+# (waiting for a worker included) is answered with an error, so that no
+# request holds its session for ever.
+SEARCH_GRACE = 30.0
+
+
+def _search_worker(state: GameState, time_limit: float, itermax: int):
+    """ Worker: search a position.
+
+    Returns:
+        (move, iterations, start time, end time), times from time.time().
+    """
+    start = time.time()
+    search = AnytimeSearch(state)
+    move = search.run(time_limit=time_limit, itermax=itermax)
+    return move, search.iterations, start, time.time()
+
+
+def decode_move(move):
+    """ Convert a move from JSON (a list for SuperTicTacToe) to a Move. """
+    if isinstance(move, list):
+        return tuple(move)
+    return move
+
+
+class Session:
+    """ A game in progress.
+
+    Attributes:
+        state (GameState): The position.
+        lock (asyncio.Lock): Held while a request uses the session.
+        moves (int): Number of moves played.
+    """
+
+    def __init__(self, state: GameState):
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.moves = 0
+        self.created = time.time()
+
+    def describe(self) -> Dict:
+        """ The state of the game, for a response. """
+        state = self.state
+        over = state.is_terminal()
+        return {
+            'board': repr(state),
+            'player_to_move': 3 - state.player_just_moved,
+            'moves_played': self.moves,
+            'legal_moves': state.get_moves(),
+            'over': over,
+            'result': state.get_result(1) if over else None,
+        }
+
+
+class Metrics:
+    """ Request counts, queueing and latency statistics.
+
+    Attributes:
+        requests (Counter): Requests handled, per op.
+        errors (int): Requests answered with an error.
+        in_flight (int): Searches submitted and not yet finished.
+        queue_waits (deque): Seconds recent searches waited for a worker.
+        latencies (deque): Seconds to answer recent searches.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.requests = collections.Counter()
+        self.errors = 0
+        self.in_flight = 0
+        self.queue_waits = collections.deque(maxlen=window)
+        self.latencies = collections.deque(maxlen=window)
+
+    @staticmethod
+    def summary(samples) -> Dict:
+        """ Count, mean, 95th percentile and max of samples. """
+        if not samples:
+            return {'count': 0}
+        ordered = sorted(samples)
+        return {'count': len(ordered),
+                'mean': sum(ordered) / len(ordered),
+                'p95': ordered[min(len(ordered) - 1,
+                                   int(0.95 * len(ordered)))],
+                'max': ordered[-1]}
+
+    def report(self) -> Dict:
+        return {'requests': dict(self.requests), 'errors': self.errors,
+                'in_flight_searches': self.in_flight,
+                'queue_wait': self.summary(self.queue_waits),
+                'search_latency': self.summary(self.latencies)}
+
+
+class GameServer:
+    """ Handles requests for many sessions. Transport independent. """
+
+    def __init__(self, workers: int = None):
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.metrics = Metrics()
+
+    async def handle(self, request: Dict) -> Dict:
+        """ Handle one request and return its response. """
+        op = request.get('op')
+        try:
+            if not isinstance(op, str):
+                raise ValueError('op must be a string')
+            self.metrics.requests[op] += 1
+            if op == 'new':
+                response = self.new_session(request)
+            elif op == 'metrics':
+                response = self.metrics.report()
+                response['sessions'] = len(self.sessions)
+            elif op in ('move', 'search', 'state', 'close'):
+                session = self.sessions.get(request.get('session'))
+                if session is None:
+                    raise ValueError('unknown session')
+                async with session.lock:
+                    response = await getattr(self, 'op_' + op)(request,
+                                                               session)
+            else:
+                raise ValueError('unknown op: ' + str(op))
+        except (ValueError, TypeError, AssertionError) as e:
+            self.metrics.errors += 1
+            response = {'error': str(e) or type(e).__name__}
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    def new_session(self, request: Dict) -> Dict:
+        game = getattr(game_state, request.get('game', 'SuperTicTacToe'),
+                       None)
+        if not (isinstance(game, type) and issubclass(game, GameState)):
+            raise ValueError('unknown game')
+        name = 's' + str(next(self.ids))
+        self.sessions[name] = Session(game())
+        response = {'session': name}
+        response.update(self.sessions[name].describe())
+        return response
+
+    async def op_move(self, request: Dict, session: Session) -> Dict:
+        move = decode_move(request.get('move'))
+        if move not in session.state.get_moves():
+            raise ValueError('illegal move')
+        session.state.do_move(move)
+        session.moves += 1
+        return session.describe()
+
+    async def op_search(self, request: Dict, session: Session) -> Dict:
+        if session.state.is_terminal():
+            raise ValueError('game over')
+        time_limit = float(request.get('time', DEFAULT_TIME))
+        if not (math.isfinite(time_limit) and time_limit > 0):
+            raise ValueError('time must be a positive number')
+        time_limit = min(time_limit, MAX_TIME)
+        itermax = request.get('iterations')
+        if itermax is not None and (type(itermax) is not int or
+                                    itermax <= 0):
+            raise ValueError('iterations must be a positive integer')
+        submitted = time.time()
+        self.metrics.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            move, iterations, start, end = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, _search_worker,
+                                     session.state.clone(), time_limit,
+                                     itermax),
+                time_limit + SEARCH_GRACE)
+        except asyncio.TimeoutError:
+            raise ValueError('search timed out')
+        finally:
+            self.metrics.in_flight -= 1
+        finished = time.time()
+        self.metrics.queue_waits.append(start - submitted)
+        self.metrics.latencies.append(finished - submitted)
+
+        if request.get('play', False):
+            session.state.do_move(move)
+            session.moves += 1
+        response = session.describe()
+        response.update({'move': move, 'iterations': iterations,
+                         'queue_wait': start - submitted,
+                         'search_time': end - start,
+                         'latency': finished - submitted})
+        return response
+
+    async def op_state(self, request: Dict, session: Session) -> Dict:
+        return session.describe()
+
+    async def op_close(self, request: Dict, session: Session) -> Dict:
+        del self.sessions[request['session']]
+        return {'closed': request['session']}
+
+    async def serve_stream(self, reader: asyncio.StreamReader, write):
+        """ Answer the JSON lines read from reader, each in its own task.
+
+        Args:
+            reader: Where the requests come from.
+            write: Called with each response line.
+        """
+        tasks = set()
+
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('request must be an object')
+            except ValueError as e:
+                self.metrics.errors += 1
+                response = {'error': 'bad request: ' + str(e)}
+            else:
+                try:
+                    response = await self.handle(request)
+                except Exception as e:
+                    # A bug must not leave the request unanswered.
+                    self.metrics.errors += 1
+                    response = {'error': 'internal error: ' +
+                                (str(e) or type(e).__name__)}
+                    if 'id' in request:
+                        response['id'] = request['id']
+            await write(json.dumps(response) + '\n')
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        """ Serve one socket client. """
+
+        async def write(text: str):
+            writer.write(text.encode())
+            await writer.drain()
+
+        try:
+            await self.serve_stream(reader, write)
+        finally:
+            writer.close()
+
+    async def serve_stdio(self):
+        """ Serve requests from stdin, answering on stdout. """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        async def write(text: str):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        await self.serve_stream(reader, write)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+async def main_async(args):
+    server = GameServer(workers=args.workers)
+    try:
+        if args.port is not None:
+            s = await asyncio.start_server(server.handle_connection,
+                                           '127.0.0.1', args.port)
+        elif args.unix is not None:
+            s = await asyncio.start_unix_server(server.handle_connection,
+                                                args.unix)
+        else:
+            await server.serve_stdio()
+            return
+        async with s:
+            await s.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, help='serve on localhost:PORT')
+    parser.add_argument('--unix', metavar='PATH',
+                        help='serve on a Unix socket')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='search processes (default one per core)')
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Exact game solving, and Monte Carlo Tree Search that uses proven results.
+
+Solver is a memoised negamax search with alpha-beta pruning and a
+transposition table. It works with any GameState: the result of a position
+is get_result() at the end of perfect play. TicTacToe is small enough to
+solve from the start, and late SuperTicTacToe positions, with few empty
+squares left, are solved in a fraction of a second.
+
+search() is an MCTS-Solver: a UCT search whose nodes can hold a proven
+result. A node is proven when its state is terminal, when it has at most
+'threshold' empty squares left (it is then solved exactly instead of being
+rolled out), or when the proofs of its children settle it: a move that
+wins for the player making it proves the parent lost for the other player,
+and a fully expanded node whose children are all proven takes the best of
+them. Proven nodes are not rolled out again, children proven to lose are
+never selected, and a proven win at the root is played at once.
+"""
+import math
+import random
+
+from game_state import GameState
+from play import Node
+
+# Transposition table flags.
+EXACT = 0
+LOWER = 1  # The value is a lower bound.
+UPPER = 2  # The value is an upper bound.
+
+
+def state_key(state: GameState):
+    """ A key identifying state for a transposition table.
+
+    The Zobrist hash if the state has one, otherwise its printed board and
+    the player that just moved.
+    """
+    zobrist = getattr(state, 'zobrist', None)
+    if zobrist is not None:
+        return zobrist
+    return (repr(state), state.player_just_moved)
+
+
+class Solver:
+    """ Memoised negamax search with alpha-beta pruning.
+
+    Attributes:
+        table (Dict): Key of a position to (value, flag), where value is the
+            result for the player to move and flag is EXACT, LOWER or UPPER.
+        max_entries (int): The table is cleared when it grows beyond this.
+        nodes (int): Positions searched.
+    """
+
+    def __init__(self, max_entries: int = 1 << 22):
+        self.table = {}
+        self.max_entries = max_entries
+        self.nodes = 0
+
+    def solve(self, state: GameState) -> float:
+        """ Solve a position exactly.
+
+        Returns:
+            The result of perfect play from the viewpoint of
+            state.player_just_moved: 1.0 win, 0.0 loss, 0.5 draw.
+        """
+        return 1.0 - self.negamax(state, 0.0, 1.0)
+
+    def best_move(self, state: GameState) -> 'Move':
+        """ Return a move that is best with perfect play, None if terminal. """
+        best = None
+        best_value = -1.0
+        for m in state.get_moves():
+            child = state.clone()
+            child.do_move(m)
+            value = self.solve(child)
+            if value > best_value:
+                best = m
+                best_value = value
+                if value == 1.0:
+                    break
+        return best
+
+    def negamax(self, state: GameState, alpha: float, beta: float) -> float:
+        """ The result of state for the player to move, within [alpha, beta].
+
+        Returns a value <= alpha if the true value is <= alpha, and >= beta if
+        the true value is >= beta (fail soft).
+        """
+        self.nodes += 1
+        moves = state.get_moves()
+        if moves == []:
+            return state.get_result(3 - state.player_just_moved)
+
+        key = state_key(state)
+        entry = self.table.get(key)
+        if entry is not None:
+            value, flag = entry
+            if flag == EXACT:
+                return value
+            elif flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        original_alpha = alpha
+        best = -1.0
+        for m in moves:
+            child = state.clone()
+            child.do_move(m)
+            value = 1.0 - self.negamax(child, 1.0 - beta, 1.0 - alpha)
+            if value > best:
+                best = value
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        if len(self.table) >= self.max_entries:
+            self.table.clear()
+        if best <= original_alpha:
+            self.table[key] = (best, UPPER)
+        elif best >= beta:
+            self.table[key] = (best, LOWER)
+        else:
+            self.table[key] = (best, EXACT)
+        return best
+
+
+class SolverNode(Node):
+    """ A node in an MCTS-Solver tree.
+
+    Attributes:
+        proven (float): None if unknown, otherwise the result with perfect
+            play from the viewpoint of player_just_moved.
+    """
+
+    def __init__(self, move=None, parent: 'SolverNode'=None,
+                 state: GameState=None, solver: Solver=None,
+                 threshold: int = 0):
+        super().__init__(move=move, parent=parent, state=state)
+        self.solver = solver
+        self.threshold = threshold
+        self.proven = None
+        if self.untried_moves == []:
+            self.proven = state.get_result(self.player_just_moved)
+        else:
+            empty = state.empty_squares()
+            if empty is not None and empty <= threshold:
+                self.proven = solver.solve(state)
+
+    def select_child(self) -> 'SolverNode':
+        """ Use the UCB1 formula to select a child node, skipping children
+        proven lost for the player making the move.
+        """
+        candidates = [c for c in self.child_nodes if c.proven != 0.0]
+        return sorted(candidates,
+                      key=lambda c: c.wins / c.visits + math.sqrt(
+                          2 * math.log(self.visits) / c.visits))[-1]
+
+    def add_child(self, move, s: GameState) -> 'SolverNode':
+        """ Remove m from untried_moves and add a new child node for this move.
+            Return the added child node
+        """
+        n = SolverNode(move=move, parent=self, state=s, solver=self.solver,
+                       threshold=self.threshold)
+        self.untried_moves.remove(move)
+        self.child_nodes.append(n)
+        return n
+
+    def try_prove(self) -> bool:
+        """ Prove this node from its children, if they settle it.
+
+        Returns:
+            True if the node is proven.
+        """
+        if self.proven is not None:
+            return True
+        values = [c.proven for c in self.child_nodes]
+        if 1.0 in values:
+            # The player to move has a winning move.
+            self.proven = 0.0
+        elif self.untried_moves == [] and None not in values:
+            self.proven = 1.0 - max(values)
+        return self.proven is not None
+
+    def __repr__(self):
+        s = super().__repr__()
+        if self.proven is not None:
+            s = s[:-1] + " P:" + str(self.proven) + "]"
+        return s
+
+
+def iterate(rootnode: SolverNode, rootstate: GameState, itermax: int):
+    """ Run MCTS-Solver iterations, stopping early if the root is proven. """
+    for i in range(itermax):
+        if rootnode.proven is not None:
+            return
+        node = rootnode
+        state = rootstate.clone()
+
+        # Select, stopping at proven nodes.
+        while (node.proven is None and node.untried_moves == [] and
+               node.child_nodes != []):
+            node = node.select_child()
+            state.do_move(node.move)
+
+        # Expand
+        if node.proven is None and node.untried_moves != []:
+            m = random.choice(node.untried_moves)
+            state.do_move(m)
+            node = node.add_child(m, state)
+
+        if node.proven is not None:
+            # No rollout needed; the result for each player follows.
+            owner = node.player_just_moved
+            result = {owner: node.proven, 3 - owner: 1.0 - node.proven}
+        else:
+            state.do_random_rollout(random)
+            result = {1: state.get_result(1), 2: state.get_result(2)}
+
+        # Backpropagate, proving ancestors where possible.
+        proving = True
+        while node is not None:
+            node.update(result[node.player_just_moved])
+            if proving and node.parent_node is not None:
+                proving = node.parent_node.try_prove()
+            node = node.parent_node
+
+
+def best_move(rootnode: SolverNode) -> 'Move':
+    """ Return a proven win if there is one, otherwise the most visited move
+    not proven to lose (or any move if all lose).
+    """
+    children = rootnode.child_nodes
+    for c in children:
+        if c.proven == 1.0:
+            return c.move
+    candidates = [c for c in children if c.proven != 0.0] or children
+    return sorted(candidates, key=lambda c: c.visits)[-1].move
+
+
+def search(rootstate: GameState, itermax: int, threshold: int = 12,
+           solver: Solver = None, verbose=False) -> 'Move':
+    """ Do an MCTS-Solver search.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Maximum iterations to search.
+        threshold: Positions with at most this many empty squares are solved
+            exactly instead of being rolled out.
+        solver: The Solver to use; keeping one between moves keeps its
+            transposition table. Default is a new Solver.
+        verbose: True => print stuff out.
+
+    Returns:
+        The best move.
+    """
+    if solver is None:
+        solver = Solver()
+    empty = rootstate.empty_squares()
+    if empty is not None and empty <= threshold:
+        return solver.best_move(rootstate)
+    rootnode = SolverNode(state=rootstate, solver=solver, threshold=threshold)
+    iterate(rootnode, rootstate, itermax)
+    if verbose:
+        print(rootnode.children_to_string())
+    return best_move(rootnode)
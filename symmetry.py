@@ -0,0 +1,243 @@
+"""
+The 8 symmetries of the tic tac toe grid, and canonical forms of positions.
+
+TicTacToe and SuperTicTacToe are unchanged by rotating or reflecting the
+3 x 3 grid. For SuperTicTacToe the same symmetry is applied to the sub board
+index and to the square index, so square (sub_board, square) goes to
+(p[sub_board], p[square]), and last_square_played goes to
+p[last_square_played].
+
+The canonical form of a position is its image with the smallest encoding
+over the 8 symmetries. Equivalent positions have the same canonical form,
+and canonical_key() hashes it to a 64 bit key.
+
+search() is a UCT search using SymmetricNode, which expands only one of each
+set of equivalent moves (moves exchanged by a symmetry of the position), so
+they share a single child and its statistics. This matters most near the
+root: the 81 first moves of SuperTicTacToe fall into 15 classes. To measure
+what it is worth in play, find the iterations plain search needs to match
+it:
+
+    python tournament.py --game BitboardSuperTicTacToe --games 400 \
+        --searches symmetric plain --equal-strength 100
+"""
+import hashlib
+from typing import List, Tuple
+
+from game_state import (GameState, TicTacToe, SuperTicTacToe,
+                        BitboardSuperTicTacToe)
+from play import Node, iterate, best_move
+
+
+def _permutation(f) -> Tuple[int, ...]:
+    """ The permutation of squares 0 - 8 taking (row, col) to f(row, col). """
+    p = [0] * 9
+    for i in range(9):
+        row, col = f(i // 3, i % 3)
+        p[i] = 3 * row + col
+    return tuple(p)
+
+
+# SYMMETRIES[t][i] is the square that square i goes to under symmetry t.
+# Symmetry 0 is the identity.
+SYMMETRIES = [
+    _permutation(lambda r, c: (r, c)),
+    _permutation(lambda r, c: (c, 2 - r)),
+    _permutation(lambda r, c: (2 - r, 2 - c)),
+    _permutation(lambda r, c: (2 - c, r)),
+    _permutation(lambda r, c: (r, 2 - c)),
+    _permutation(lambda r, c: (2 - r, c)),
+    _permutation(lambda r, c: (c, r)),
+    _permutation(lambda r, c: (2 - c, 2 - r)),
+]
+
+# INVERSES[t] is the index of the inverse of symmetry t.
+INVERSES = [next(u for u in range(8)
+                 if all(SYMMETRIES[u][SYMMETRIES[t][i]] == i for i in range(9)))
+            for t in range(8)]
+
+# _SOURCES[t][j] is the square (0 - 80) of a SuperTicTacToe board that
+# symmetry t moves to square j.
+_SOURCES = [[0] * 81 for t in range(8)]
+for _t, _p in enumerate(SYMMETRIES):
+    for _i in range(81):
+        _SOURCES[_t][9 * _p[_i // 9] + _p[_i % 9]] = _i
+
+# _MASK_IMAGES[t][mask] is the image under symmetry t of a 9 bit mask of
+# squares, as used by BitboardSuperTicTacToe.
+_MASK_IMAGES = [[sum(1 << _p[_i] for _i in range(9) if _mask >> _i & 1)
+                 for _mask in range(512)]
+                for _p in SYMMETRIES]
+
+
+def cells(state: GameState) -> List[int]:
+    """ The owner (0, 1 or 2) of each square of state.
+
+    For SuperTicTacToe games, square (sub_board, square) is at index
+    9 * sub_board + square.
+    """
+    if isinstance(state, TicTacToe):
+        return state.board
+    elif isinstance(state, SuperTicTacToe):
+        return [owner for sub in state.board for owner in sub]
+    elif isinstance(state, BitboardSuperTicTacToe):
+        x, o = state.marks[1], state.marks[2]
+        return [1 if x >> i & 1 else 2 if o >> i & 1 else 0
+                for i in range(81)]
+    raise TypeError('No symmetries known for ' + type(state).__name__)
+
+
+def transform_move(move, t: int):
+    """ Return the image of a move under symmetry t.
+
+    Moves are squares (0 - 8) for TicTacToe and (sub_board, square) for
+    SuperTicTacToe.
+    """
+    p = SYMMETRIES[t]
+    if isinstance(move, tuple):
+        return (p[move[0]], p[move[1]])
+    return p[move]
+
+
+def encodings(state: GameState) -> List[bytes]:
+    """ The encoding of the image of state under each symmetry.
+
+    The encoding is the owner of each square, followed for SuperTicTacToe
+    games by the sub board the next player is sent to (9 if the first move
+    has not been played, as any square may then be marked).
+    """
+    board = cells(state)
+    if len(board) == 9:
+        return [bytes(board[SYMMETRIES[INVERSES[t]][j]] for j in range(9))
+                for t in range(8)]
+    if state.squares_played == 0:
+        last = [9] * 8
+    else:
+        last = [p[state.last_square_played] for p in SYMMETRIES]
+    return [bytes([board[i] for i in _SOURCES[t]] + [last[t]])
+            for t in range(8)]
+
+
+def canonical(state: GameState) -> Tuple[bytes, int]:
+    """ Return the canonical encoding of state and the symmetry giving it.
+
+    Returns:
+        (encoding, t) where symmetry t takes state to its canonical form.
+        Of several such symmetries, the lowest numbered is returned.
+    """
+    images = encodings(state)
+    t = min(range(8), key=lambda u: images[u])
+    return images[t], t
+
+
+def canonical_key(state: GameState) -> Tuple[int, int]:
+    """ Return a 64 bit key of the canonical form of state.
+
+    Returns:
+        (key, t) where symmetry t takes state to its canonical form.
+    """
+    encoding, t = canonical(state)
+    key = int.from_bytes(hashlib.blake2b(encoding, digest_size=8).digest(),
+                         'little')
+    return key, t
+
+
+def stabilizer(state: GameState) -> List[int]:
+    """ Return the symmetries that leave state unchanged (always includes 0).
+    """
+    if isinstance(state, TicTacToe):
+        board = state.board
+        return [t for t in range(8)
+                if all(board[SYMMETRIES[t][i]] == board[i] for i in range(9))]
+    if state.squares_played == 0:
+        candidates = range(8)
+    else:
+        # The sub board the next player is sent to must not move.
+        last = state.last_square_played
+        candidates = [t for t in range(8) if SYMMETRIES[t][last] == last]
+    if isinstance(state, BitboardSuperTicTacToe):
+        return [t for t in candidates
+                if _fixes_bitboard(state.marks[1], t) and
+                _fixes_bitboard(state.marks[2], t)]
+    board = cells(state)
+    return [t for t in candidates
+            if all(board[i] == board[j] for j, i in enumerate(_SOURCES[t]))]
+
+
+def _fixes_bitboard(marks: int, t: int) -> bool:
+    """ Check if symmetry t leaves an 81 bit BitboardSuperTicTacToe bitboard
+    unchanged.
+    """
+    images = _MASK_IMAGES[t]
+    p = SYMMETRIES[t]
+    for sub_board in range(9):
+        if images[(marks >> (9 * sub_board)) & 511] != (
+                marks >> (9 * p[sub_board])) & 511:
+            return False
+    return True
+
+
+def unique_moves(state: GameState, moves: List['Move'] = None) -> List['Move']:
+    """ Return one move of each class of equivalent moves of state.
+
+    Two moves are equivalent if a symmetry that leaves state unchanged takes
+    one to the other; they lead to equivalent positions. The first move of
+    each class in get_moves() order is kept.
+
+    Args:
+        state: The state.
+        moves: state.get_moves(), if already known.
+    """
+    if moves is None:
+        moves = state.get_moves()
+    symmetries = stabilizer(state)
+    if len(symmetries) == 1 or moves == []:
+        return moves
+    seen = set()
+    unique = []
+    for m in moves:
+        if m not in seen:
+            unique.append(m)
+            for t in symmetries:
+                seen.add(transform_move(m, t))
+    return unique
+
+
+class SymmetricNode(Node):
+    """ A node that expands only one move of each class of equivalent moves.
+
+    The child for that move stands for the whole class, so equivalent moves
+    share one subtree and its statistics.
+    """
+
+    def __init__(self, move=None, parent: 'SymmetricNode'=None,
+                 state: GameState=None):
+        super().__init__(move=move, parent=parent, state=state)
+        self.untried_moves = unique_moves(state, self.untried_moves)
+
+    def add_child(self, move, s: GameState) -> 'SymmetricNode':
+        """ Remove m from untried_moves and add a new child node for this move.
+            Return the added child node
+        """
+        n = SymmetricNode(move=move, parent=self, state=s)
+        self.untried_moves.remove(move)
+        self.child_nodes.append(n)
+        return n
+
+
+def search(rootstate: GameState, itermax: int, verbose=False) -> 'Move':
+    """ Do a UCT search, expanding equivalent moves only once.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Iterations to search.
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    rootnode = SymmetricNode(state=rootstate)
+    iterate(rootnode, rootstate, itermax)
+    if verbose:
+        print(rootnode.children_to_string())
+    return best_move(rootnode)
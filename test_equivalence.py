@@ -0,0 +1,109 @@
+"""
+Tests that the game implementations and the search variants that must play
+the same seeded games do so.
+
+Run with:
+    python -m pytest -q
+"""
+import copy
+import random
+
+import pytest
+
+import nested_game
+import play
+from game_state import TicTacToe, SuperTicTacToe, BitboardSuperTicTacToe
+
+SEEDS = range(5)
+
+
+def nested_super() -> nested_game.NestedGame:
+    return nested_game.NestedGame(nested_game.SUPER_TIC_TAC_TOE)
+
+
+def nested_tictactoe() -> nested_game.NestedGame:
+    return nested_game.NestedGame(nested_game.TIC_TAC_TOE)
+
+
+SUPER_GAMES = [SuperTicTacToe, BitboardSuperTicTacToe, nested_super]
+ALL_GAMES = [TicTacToe, nested_tictactoe] + SUPER_GAMES
+
+
+def random_game(game, seed: int):
+    """ The moves and results of a game of random moves. """
+    rng = random.Random(seed)
+    state = game()
+    moves = []
+    move = state.get_random_move(rng)
+    while move is not None:
+        state.do_move(move)
+        moves.append(move)
+        move = state.get_random_move(rng)
+    return moves, state.get_result(1), state.get_result(2)
+
+
+def snapshot(state) -> dict:
+    """ A copy of the attributes of state (board, zobrist hash, history and
+    so on), to compare after undo_move.
+    """
+    return {name: value if name == 'rules' else copy.deepcopy(value)
+            for name, value in vars(state).items()}
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_seeded_super_games_are_identical(seed):
+    games = [random_game(game, seed) for game in SUPER_GAMES]
+    assert games[1] == games[0]
+    assert games[2] == games[0]
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_seeded_tictactoe_games_are_identical(seed):
+    assert random_game(nested_tictactoe, seed) == random_game(TicTacToe, seed)
+
+
+@pytest.mark.parametrize('game', ALL_GAMES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_get_random_move_matches_choice(game, seed):
+    rng = random.Random(seed)
+    choice_rng = random.Random(seed)
+    state = game()
+    while state.has_moves():
+        move = state.get_random_move(rng)
+        assert move == choice_rng.choice(state.get_moves())
+        state.do_move(move)
+    assert state.get_random_move(rng) is None
+
+
+@pytest.mark.parametrize('game', ALL_GAMES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_undo_move_restores_state(game, seed):
+    rng = random.Random(seed)
+    state = game()
+    while state.has_moves():
+        before = snapshot(state)
+        board = repr(state)
+        for move in state.get_moves():
+            state.do_move(move)
+            state.undo_move(move)
+            assert repr(state) == board
+            assert snapshot(state) == before
+        state.do_move(state.get_random_move(rng))
+
+
+@pytest.mark.parametrize('game', [TicTacToe, SuperTicTacToe,
+                                  BitboardSuperTicTacToe])
+@pytest.mark.parametrize('seed', range(3))
+def test_in_place_search_plays_the_same_moves(game, seed):
+    played = []
+    for in_place in (False, True):
+        random.seed(seed)
+        state = game()
+        moves = []
+        for i in range(6):
+            if not state.has_moves():
+                break
+            moves.append(play.search(state, 100, in_place=in_place))
+            state.do_move(moves[-1])
+        played.append(moves)
+    assert played[1] == played[0]
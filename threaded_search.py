@@ -0,0 +1,252 @@
+"""
+Multithreaded UCT search over one shared tree, with virtual loss.
+
+On free-threaded (no GIL) CPython builds, threads can grow one tree together
+instead of each process growing its own (see parallel.py). Every node has
+its own lock, which guards its statistics, its children and its untried
+moves, and is held only for a few operations at a time:
+
+    select      the children are read without their locks (a slightly stale
+                value only changes which child is explored); the chosen
+                child is given a virtual loss under its lock
+    expand      an untried move is taken and its child added under the lock
+                of the node expanded, so no move is expanded twice
+    backup      the result is added and the virtual loss taken back under the
+                lock of each node on the path
+
+A virtual loss counts as a visit that was lost, so while one thread is
+working below a node, other threads see it as less promising and spread out
+over other parts of the tree instead of all following the same path.
+
+With the GIL the threads take turns, so the search is correct but no faster
+than a single thread. Running this module measures the scaling from 1 to N
+threads:
+
+    python threaded_search.py --threads 1 2 4 8 --iterations 10000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import game_state
+from game_state import GameState
+from play import Node, best_move
+
+
+class ThreadedNode(Node):
+    """ A node of a tree shared by several threads.
+
+    Attributes:
+        virtual_loss (int): Visits by iterations still in progress below this
+            node; counted as lost visits by select_child().
+        lock (threading.RLock): Guards the attributes of this node.
+            Reentrant, so that expand() can call add_child() holding it.
+    """
+
+    def __init__(self, move=None, parent: 'ThreadedNode'=None,
+                 state: GameState=None):
+        super().__init__(move=move, parent=parent, state=state)
+        self.virtual_loss = 0
+        self.lock = threading.RLock()
+
+    def select_child(self) -> 'ThreadedNode':
+        """ Use the UCB1 formula, counting virtual losses as lost visits, to
+        select a child node.
+
+        With no virtual losses this is the same as Node.select_child().
+        """
+        with self.lock:
+            children = self.child_nodes[:]
+            log_visits = math.log(self.visits + self.virtual_loss)
+
+        def value(c: ThreadedNode) -> float:
+            # backup() adds the visit before taking back the virtual loss, so
+            # reading them in the other order always counts at least one.
+            n = c.virtual_loss + c.visits
+            return c.wins / n + math.sqrt(2 * log_visits / n)
+
+        return sorted(children, key=value)[-1]
+
+    def add_child(self, move, s: GameState) -> 'ThreadedNode':
+        """ Remove move from untried_moves and add a new child node for it.
+        Thread safe. Return the added child node.
+        """
+        with self.lock:
+            n = ThreadedNode(move=move, parent=self, state=s)
+            self.untried_moves.remove(move)
+            self.child_nodes.append(n)
+        return n
+
+    def expand(self, state: GameState, rng) -> 'ThreadedNode':
+        """ Add a child for a random untried move, with a virtual loss.
+
+        Args:
+            state: The state at this node; updated with the move expanded.
+            rng: Source of randomness.
+
+        Returns:
+            The new child, or None if there is no untried move left.
+        """
+        with self.lock:
+            if self.untried_moves == []:
+                return None
+            m = rng.choice(self.untried_moves)
+            state.do_move(m)
+            child = self.add_child(m, state)
+            # select_child() copies the children under the lock, so it never
+            # sees the child without its virtual loss.
+            child.virtual_loss = 1
+        return child
+
+    def add_virtual_loss(self):
+        with self.lock:
+            self.virtual_loss += 1
+
+    def update(self, result, visits=1):
+        """ Update this node, as Node.update(). Thread safe. """
+        with self.lock:
+            self.visits += visits
+            self.wins += result
+
+    def backup(self, result: float):
+        """ Record the result of an iteration that gave this node a virtual
+        loss, and take the virtual loss back.
+        """
+        with self.lock:
+            self.visits += 1
+            self.wins += result
+            self.virtual_loss -= 1
+
+
+def iterate(rootnode: ThreadedNode, rootstate: GameState, itermax: int,
+            rng=random):
+    """ Add itermax iterations to a shared tree. Safe to run in several
+    threads at once on the same tree.
+
+    Args:
+        rootnode: Root of the tree, created from rootstate.
+        rootstate: The state at rootnode (not modified).
+        itermax: Iterations to search.
+        rng: Source of randomness; give each thread its own random.Random.
+    """
+    for i in range(itermax):
+        state = rootstate.clone()
+        node = rootnode
+        node.add_virtual_loss()
+        path = [node]
+        while True:
+            # Expand, if another thread has not expanded the last move.
+            child = node.expand(state, rng)
+            if child is not None:
+                path.append(child)
+                break
+            if node.child_nodes == []:
+                # Terminal
+                break
+            node = node.select_child()
+            node.add_virtual_loss()
+            state.do_move(node.move)
+            path.append(node)
+
+        state.do_random_rollout(rng)
+        for node in path:
+            node.backup(state.get_result(node.player_just_moved))
+
+
+class ThreadedSearch:
+    """ A UCT search of one shared tree by a pool of threads.
+
+    Call it like play.search, or pass it to play.play_game as the searcher.
+
+    Attributes:
+        threads (int): Number of threads.
+    """
+
+    def __init__(self, threads: int = 4):
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def __call__(self, rootstate: GameState, itermax: int) -> 'Move':
+        return best_move(self.tree(rootstate, itermax))
+
+    def tree(self, rootstate: GameState, itermax: int) -> ThreadedNode:
+        """ Grow a tree of itermax iterations, shared out over the threads.
+
+        Returns:
+            The root of the tree.
+        """
+        rootnode = ThreadedNode(state=rootstate)
+        counts = [itermax // self.threads + (t < itermax % self.threads)
+                  for t in range(self.threads)]
+        futures = [self.pool.submit(iterate, rootnode, rootstate, n,
+                                    random.Random(random.getrandbits(32)))
+                   for n in counts]
+        for f in futures:
+            f.result()
+        return rootnode
+
+    def close(self):
+        """ Shut down the thread pool. """
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def gil_enabled() -> bool:
+    """ Check if this Python runs with the GIL. """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def scaling(game: type, itermax: int, thread_counts: List[int],
+            seed: int = 0) -> List[dict]:
+    """ Time a search of itermax iterations with each number of threads.
+
+    Returns:
+        For each thread count, the iterations per second and the speedup
+        over the first thread count.
+    """
+    results = []
+    for threads in thread_counts:
+        random.seed(seed)
+        with ThreadedSearch(threads) as searcher:
+            start = time.perf_counter()
+            searcher.tree(game(), itermax)
+            seconds = time.perf_counter() - start
+        rate = itermax / seconds if seconds > 0 else 0.0
+        results.append({'threads': threads, 'iters_per_sec': rate,
+                        'speedup': rate / results[0]['iters_per_sec']
+                        if results else 1.0})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--game', default='BitboardSuperTicTacToe',
+                        help='GameState class (default '
+                             'BitboardSuperTicTacToe)')
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4],
+                        help='thread counts to time')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    game = getattr(game_state, args.game)
+    for result in scaling(game, args.iterations, args.threads, args.seed):
+        result['gil'] = gil_enabled()
+        print(json.dumps(result), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
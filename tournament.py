@@ -0,0 +1,252 @@
+"""
+Self-play tournament between two search strengths.
+
+Plays many seeded games between player A and player B (each a number of
+search iterations per move) on a pool of worker processes, with A and B
+taking turns to play first. Each game is independent, so throughput scales
+with the number of cores.
+
+A JSON line is printed for every game as it finishes (winner, number of
+moves, mean time per move and iterations per second), then a summary with
+the win, draw and loss rates of A and 95% confidence intervals.
+
+Each player can also use a different search (see SEARCHES). With
+--equal-strength, A plays a fixed number of iterations against B at a range
+of iteration budgets, and the budget at which B scores as well as A is
+interpolated: the time-to-equal-strength of the two searches.
+
+Usage:
+    python tournament.py --games 1000 --strengths 1000 100 --workers 32
+    python tournament.py --games 200 --searches symmetric plain \
+        --equal-strength 100 --budgets 50 100 150 200 300
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import game_state
+import play
+import symmetry
+
+# Search functions the players can use, by name.
+SEARCHES = {
+    'plain': play.search,
+    'symmetric': symmetry.search,
+}
+
+
+def play_one(task: Tuple[str, int, int, int, int, str, str]) -> Dict:
+    """ Play one game of the tournament.
+
+    Args:
+        task: (game class name, game index, seed, strength of A, strength of
+            B, search of A, search of B), the searches named in SEARCHES.
+            A plays first in the even numbered games.
+
+    Returns:
+        The game record, with 'winner' as 'A', 'B' or 'draw'.
+    """
+    game_name, index, seed, strength_a, strength_b, search_a, search_b = task
+    random.seed(seed)
+    state = getattr(game_state, game_name)()
+    a_is_player_1 = index % 2 == 0
+    # players[p - 1] is the name, strength and search of player p.
+    players = [('A', strength_a, SEARCHES[search_a]),
+               ('B', strength_b, SEARCHES[search_b])]
+    if not a_is_player_1:
+        players.reverse()
+
+    moves = 0
+    iterations = 0
+    seconds = 0.0
+    side_seconds = {'A': 0.0, 'B': 0.0}
+    side_iterations = {'A': 0, 'B': 0}
+    start = time.perf_counter()
+    while not state.is_terminal():
+        name, itermax, search = players[2 - state.player_just_moved]
+        move_start = time.perf_counter()
+        m = search(state, itermax)
+        move_seconds = time.perf_counter() - move_start
+        seconds += move_seconds
+        iterations += itermax
+        side_seconds[name] += move_seconds
+        side_iterations[name] += itermax
+        state.do_move(m)
+        moves += 1
+
+    result = state.get_result(1)
+    if result == 0.5:
+        winner = 'draw'
+    elif (result == 1.0) == a_is_player_1:
+        winner = 'A'
+    else:
+        winner = 'B'
+    return {
+        'game': index,
+        'seed': seed,
+        'a_is_player_1': a_is_player_1,
+        'winner': winner,
+        'moves': moves,
+        'time_per_move': seconds / moves if moves else 0.0,
+        'iters_per_sec': iterations / seconds if seconds > 0 else 0.0,
+        'a_iterations': side_iterations['A'],
+        'a_search_seconds': side_seconds['A'],
+        'b_iterations': side_iterations['B'],
+        'b_search_seconds': side_seconds['B'],
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run(game_name: str, games: int, strength_a: int, strength_b: int,
+        workers: int = None, seed: int = 0, search_a: str = 'plain',
+        search_b: str = 'plain') -> Iterator[Dict]:
+    """ Play a tournament, yielding each game record as it finishes.
+
+    Args:
+        game_name: Name of a GameState class in game_state.
+        games: Number of games.
+        strength_a: Iterations per move of player A.
+        strength_b: Iterations per move of player B.
+        workers: Number of worker processes, default one per core.
+        seed: Game i is played with seed seed + i.
+        search_a: Search of player A, a name in SEARCHES.
+        search_b: Search of player B.
+    """
+    tasks = [(game_name, i, seed + i, strength_a, strength_b, search_a,
+              search_b) for i in range(games)]
+    with multiprocessing.Pool(processes=workers) as pool:
+        for record in pool.imap_unordered(play_one, tasks):
+            yield record
+
+
+def wilson_interval(successes: float, n: int,
+                    z: float = 1.96) -> Tuple[float, float]:
+    """ Wilson score confidence interval for a proportion (95% by default).
+    """
+    if n == 0:
+        return (0.0, 1.0)
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+
+def summarize(records: List[Dict]) -> Dict:
+    """ Aggregate win rates of player A over the game records. """
+    n = len(records)
+    wins = sum(1 for r in records if r['winner'] == 'A')
+    losses = sum(1 for r in records if r['winner'] == 'B')
+    draws = n - wins - losses
+    summary = {'games': n, 'a_wins': wins, 'b_wins': losses, 'draws': draws}
+    for name, count in (('a_win_rate', wins), ('b_win_rate', losses),
+                        ('draw_rate', draws)):
+        summary[name] = count / n if n else 0.0
+        summary[name + '_ci95'] = wilson_interval(count, n)
+    # Score counts a draw as half a win.
+    score = wins + 0.5 * draws
+    summary['a_score'] = score / n if n else 0.0
+    summary['a_score_ci95'] = wilson_interval(score, n)
+    seconds = sum(r['seconds'] for r in records)
+    summary['games_per_cpu_sec'] = n / seconds if seconds > 0 else 0.0
+    for side in ('a', 'b'):
+        side_seconds = sum(r[side + '_search_seconds'] for r in records)
+        side_iterations = sum(r[side + '_iterations'] for r in records)
+        summary[side + '_seconds_per_iteration'] = (
+            side_seconds / side_iterations if side_iterations else 0.0)
+    return summary
+
+
+def equal_strength(game_name: str, games: int, strength_a: int,
+                   budgets: List[int], workers: int = None, seed: int = 0,
+                   search_a: str = 'symmetric', search_b: str = 'plain'
+                   ) -> Dict:
+    """ Find the iterations B needs to score as well as A.
+
+    A, with strength_a iterations per move, plays a match of games against B
+    at each budget (iterations per move, in increasing order). The budget at
+    which A's score falls to 0.5 is interpolated linearly in log(budget)
+    between the two budgets around it.
+
+    Returns:
+        'matches', the summary of each match; 'b_equal_iterations', the
+        interpolated budget (None if A's score does not cross 0.5 within
+        the budgets); and 'time_ratio', the seconds per move B needs to
+        equal A over the seconds per move of A (None likewise).
+    """
+    matches = []
+    for budget in budgets:
+        summary = summarize(list(run(game_name, games, strength_a, budget,
+                                     workers, seed, search_a, search_b)))
+        summary['b_strength'] = budget
+        matches.append(summary)
+
+    result = {'a_strength': strength_a, 'a_search': search_a,
+              'b_search': search_b, 'matches': matches,
+              'b_equal_iterations': None, 'time_ratio': None}
+    for before, after in zip(matches, matches[1:]):
+        high, low = before['a_score'], after['a_score']
+        if high >= 0.5 >= low and high > low:
+            f = (high - 0.5) / (high - low)
+            log_budget = ((1 - f) * math.log(before['b_strength']) +
+                          f * math.log(after['b_strength']))
+            result['b_equal_iterations'] = math.exp(log_budget)
+            break
+    if result['b_equal_iterations'] is not None:
+        a_seconds = sum(m['a_seconds_per_iteration'] for m in matches)
+        b_seconds = sum(m['b_seconds_per_iteration'] for m in matches)
+        if a_seconds > 0:
+            result['time_ratio'] = (result['b_equal_iterations'] * b_seconds /
+                                    (strength_a * a_seconds))
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--game', default='SuperTicTacToe',
+                        help='GameState class (default SuperTicTacToe)')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--strengths', type=int, nargs=2, default=[1000, 100],
+                        metavar=('A', 'B'), help='iterations per move')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default one per core)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--searches', nargs=2, default=['plain', 'plain'],
+                        choices=list(SEARCHES), metavar=('A', 'B'),
+                        help='search of each player (%s)' %
+                             ', '.join(SEARCHES))
+    parser.add_argument('--equal-strength', type=int, metavar='A',
+                        help='find the iterations B needs to equal A with A '
+                             'iterations, over --budgets')
+    parser.add_argument('--budgets', type=int, nargs='+',
+                        default=[50, 100, 150, 200, 300],
+                        help='iterations of B to try with --equal-strength')
+    args = parser.parse_args(argv)
+
+    if args.equal_strength is not None:
+        print(json.dumps(equal_strength(
+            args.game, args.games, args.equal_strength, args.budgets,
+            args.workers, args.seed, *args.searches)))
+        return 0
+
+    start = time.perf_counter()
+    records = []
+    for record in run(args.game, args.games, args.strengths[0],
+                      args.strengths[1], args.workers, args.seed,
+                      *args.searches):
+        records.append(record)
+        print(json.dumps(record), flush=True)
+    summary = summarize(records)
+    elapsed = time.perf_counter() - start
+    summary['games_per_sec'] = len(records) / elapsed if elapsed > 0 else 0.0
+    print(json.dumps({'summary': summary}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Monte Carlo Tree Search with a transposition table (MCTS on a DAG).
+
+The same SuperTicTacToe position is often reached by different move orders.
+play.search builds a tree, so each of those paths gets its own node and its
+own statistics. Here the statistics are kept per position instead, in a
+TranspositionTable keyed by the state's Zobrist hash (the 'zobrist'
+attribute of SuperTicTacToe and BitboardSuperTicTacToe, which do_move keeps
+up to date). All the paths to a position share its visits and wins.
+
+The table has a fixed number of slots in buckets of two. When both slots of
+a bucket are taken by other positions, the one with fewer visits is
+replaced, so the well explored positions near the root survive.
+"""
+import math
+import random
+
+from game_state import GameState
+
+
+class Entry:
+    """ The statistics of one position in a TranspositionTable.
+
+    Note that 'wins' is always from the viewpoint of player_just_moved.
+
+    Attributes:
+        key (int): Zobrist hash of the position.
+        player_just_moved (int): The player that moved into the position.
+        visits (int): Number of visits.
+        wins (float): Total of the results of those visits.
+        untried_moves (List[Move]): Moves not expanded yet, None until the
+            position is first expanded.
+        children (List[Tuple[Move, int]]): (move, key) of each expanded move.
+    """
+    __slots__ = ('key', 'player_just_moved', 'visits', 'wins',
+                 'untried_moves', 'children')
+
+    def __init__(self, key: int, player_just_moved: int):
+        self.key = key
+        self.player_just_moved = player_just_moved
+        self.visits = 0
+        self.wins = 0.0
+        self.untried_moves = None
+        self.children = []
+
+    def update(self, result):
+        """ One additional visit and result additional wins. """
+        self.visits += 1
+        self.wins += result
+
+    def __repr__(self):
+        return "[K:" + hex(self.key) + " W/V:" + str(self.wins) + "/" + str(
+            self.visits) + "]"
+
+
+class TranspositionTable:
+    """ A bounded hash table of Entry, with replacement by fewest visits.
+
+    Attributes:
+        slots (List[Entry]): The table; slots 2i and 2i + 1 are a bucket.
+        stored (int): Number of slots in use.
+        replaced (int): Number of entries replaced by other positions.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        """Create an empty table.
+
+        Args:
+            size: Number of entries, rounded up to a power of 2 (at least 2).
+        """
+        size = max(2, 1 << (size - 1).bit_length())
+        self.slots = [None] * size
+        self.mask = size - 2
+        self.stored = 0
+        self.replaced = 0
+
+    def get(self, key: int) -> Entry:
+        """ Return the entry for key, or None if it is not in the table. """
+        i = key & self.mask
+        entry = self.slots[i]
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self.slots[i + 1]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def get_or_add(self, state: GameState) -> Entry:
+        """ Return the entry for state, adding one if there is none. """
+        key = state.zobrist
+        i = key & self.mask
+        slots = self.slots
+        first = slots[i]
+        if first is not None and first.key == key:
+            return first
+        second = slots[i + 1]
+        if second is not None and second.key == key:
+            return second
+
+        entry = Entry(key, state.player_just_moved)
+        if first is None:
+            slots[i] = entry
+            self.stored += 1
+        elif second is None:
+            slots[i + 1] = entry
+            self.stored += 1
+        else:
+            if first.visits <= second.visits:
+                slots[i] = entry
+            else:
+                slots[i + 1] = entry
+            self.replaced += 1
+        return entry
+
+    def clear(self):
+        """ Remove all entries. """
+        self.slots = [None] * len(self.slots)
+        self.stored = 0
+        self.replaced = 0
+
+
+def select_child(table: TranspositionTable, entry: Entry) -> tuple:
+    """ Use the UCB1 formula to select a child of entry.
+
+    A child that is no longer in the table is moved back to the untried
+    moves of entry.
+
+    Returns:
+        (move, child entry), or (None, None) if no child is left.
+    """
+    log_visits = math.log(entry.visits)
+    best_move = None
+    best = None
+    best_value = -math.inf
+    kept = []
+    for (move, key) in entry.children:
+        child = table.get(key)
+        if child is None:
+            entry.untried_moves.append(move)
+            continue
+        kept.append((move, key))
+        if child.visits == 0:
+            value = math.inf
+        else:
+            value = child.wins / child.visits + math.sqrt(
+                2 * log_visits / child.visits)
+        if value >= best_value:
+            best_move = move
+            best = child
+            best_value = value
+    entry.children = kept
+    return best_move, best
+
+
+def iterate(table: TranspositionTable, root: Entry, rootstate: GameState,
+            itermax: int):
+    """ Run UCT iterations, keeping the statistics in table.
+
+    Args:
+        table: The transposition table.
+        root: The entry for rootstate. It is held here, so it is updated
+            even if the table replaces it.
+        rootstate: Starting state (not modified).
+        itermax: Iterations to search.
+    """
+    for i in range(itermax):
+        entry = root
+        state = rootstate.clone()
+        path = [entry]
+
+        while True:
+            if entry.untried_moves is None:
+                entry.untried_moves = state.get_moves()
+            if entry.untried_moves == [] and entry.children != []:
+                # Select
+                move, child = select_child(table, entry)
+                if child is None:
+                    continue
+                state.do_move(move)
+                entry = child
+                path.append(entry)
+            elif entry.untried_moves != []:
+                # Expand, stopping at the new (or transposed) position.
+                m = random.choice(entry.untried_moves)
+                entry.untried_moves.remove(m)
+                state.do_move(m)
+                entry.children.append((m, state.zobrist))
+                entry = table.get_or_add(state)
+                path.append(entry)
+                break
+            else:
+                # Terminal
+                break
+
+        # Rollout
+        state.do_random_rollout(random)
+
+        # Backpropagate along the path taken.
+        for entry in path:
+            entry.update(state.get_result(entry.player_just_moved))
+
+
+def search(rootstate: GameState, itermax: int,
+           table: TranspositionTable = None, verbose=False) -> 'Move':
+    """ Do a UCT search with a transposition table.
+
+    Args:
+        rootstate: Starting state, which must have a 'zobrist' hash.
+        itermax: Iterations to search.
+        table: The table to use. It is kept between calls, so statistics
+            from earlier moves of a game are reused. Default is a new table.
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    if table is None:
+        table = TranspositionTable()
+    root = table.get_or_add(rootstate)
+    iterate(table, root, rootstate, itermax)
+
+    best_move = None
+    best_visits = -1
+    for (move, key) in root.children:
+        child = table.get(key)
+        visits = child.visits if child is not None else 0
+        if visits >= best_visits:
+            best_move = move
+            best_visits = visits
+    if verbose:
+        print('Entries:', table.stored, 'replaced:', table.replaced)
+    return best_move
@@ -0,0 +1,90 @@
+"""
+UCT search with vectorized (NumPy) UCB1 child selection.
+
+play.Node.select_child sorts the children with a Python lambda, which is
+O(k log k) per level and recomputes log(visits) for every child. A
+VectorNode instead keeps the visits and wins of its children in two NumPy
+arrays, preallocated to the number of legal moves, and selects a child with
+one vectorized UCB1 evaluation and argmax.
+
+With the default exploration constant of 1.0 the UCB1 values, the tie
+breaking (last added child) and hence the games played are the same as with
+play.Node.
+"""
+import math
+
+import numpy as np
+
+from game_state import GameState
+from play import Node, iterate, best_move
+
+
+class VectorNode(Node):
+    """ A node whose children's statistics are kept in NumPy arrays.
+
+    Attributes:
+        child_visits (np.ndarray): Visits of each child, in order of
+            child_nodes.
+        child_wins (np.ndarray): Wins of each child, in order of child_nodes.
+        index (int): Position of this node in its parent's arrays.
+        exploration (float): The UCB1 exploration constant.
+    """
+
+    def __init__(self, move=None, parent: 'VectorNode'=None,
+                 state: GameState=None, exploration: float = 1.0):
+        super().__init__(move=move, parent=parent, state=state)
+        self.child_visits = np.zeros(len(self.untried_moves))
+        self.child_wins = np.zeros(len(self.untried_moves))
+        self.index = 0
+        self.exploration = exploration
+
+    def select_child(self) -> 'VectorNode':
+        """ Use the UCB1 formula to select a child node.
+
+        Computes wins/visits + exploration * sqrt(2*log(self.visits)/visits)
+        for all the children at once.
+        """
+        k = len(self.child_nodes)
+        visits = self.child_visits[:k]
+        ucb = self.child_wins[:k] / visits + self.exploration * np.sqrt(
+            2 * math.log(self.visits) / visits)
+        # argmax returns the first maximum; take the last, like sorted()[-1].
+        return self.child_nodes[k - 1 - int(np.argmax(ucb[::-1]))]
+
+    def add_child(self, move, s: GameState) -> 'VectorNode':
+        """ Remove m from untried_moves and add a new child node for this move.
+            Return the added child node
+        """
+        n = VectorNode(move=move, parent=self, state=s,
+                       exploration=self.exploration)
+        n.index = len(self.child_nodes)
+        self.untried_moves.remove(move)
+        self.child_nodes.append(n)
+        return n
+
+    def update(self, result, visits=1):
+        """ Update this node and its entry in the parent's arrays. """
+        super().update(result, visits)
+        if self.parent_node is not None:
+            self.parent_node.child_visits[self.index] += visits
+            self.parent_node.child_wins[self.index] += result
+
+
+def search(rootstate: GameState, itermax: int, exploration: float = 1.0,
+           verbose=False) -> 'Move':
+    """ Do a UCT search with vectorized child selection.
+
+    Args:
+        rootstate: Starting state.
+        itermax: Iterations to search.
+        exploration: The UCB1 exploration constant.
+        verbose: True => print stuff out.
+
+    Returns:
+        The move that was most visited.
+    """
+    rootnode = VectorNode(state=rootstate, exploration=exploration)
+    iterate(rootnode, rootstate, itermax)
+    if verbose:
+        print(rootnode.children_to_string())
+    return best_move(rootnode)